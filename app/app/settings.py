@@ -43,6 +43,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'core',
     'rest_framework',
     'rest_framework.authtoken',
@@ -96,6 +97,26 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+# Mặc định dùng local-memory. Khi có nhiều process (các uwsgi worker, lệnh
+# process_images) phải đặt CACHE_BACKEND là backend dùng chung (vd.
+# DatabaseCache), nếu không process khác không thấy version cache bị tăng
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache',
+        ),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'recipe-api'),
+    }
+}
+
+# Thời gian (giây) giữ response của recipe API trong cache
+RECIPE_CACHE_TIMEOUT = int(os.environ.get('RECIPE_CACHE_TIMEOUT', 300))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -136,6 +157,9 @@ STATIC_URL = '/static/static/'
 MEDIA_URL = '/static/media/'
 
 MEDIA_ROOT = '/vol/web/media'
+# Prefix của location internal trong nginx phục vụ MEDIA_ROOT. Khi có, file
+# media được gửi bằng X-Accel-Redirect thay vì đọc qua Django
+MEDIA_ACCEL_REDIRECT_PREFIX = os.environ.get('MEDIA_ACCEL_REDIRECT_PREFIX', '')
 STATIC_ROOT = '/vol/web/static'
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
@@ -148,6 +172,22 @@ REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
 }
 
+# Số bản ghi mặc định trên mỗi trang của các API danh sách
+API_PAGE_SIZE = int(os.environ.get('API_PAGE_SIZE', 50))
+
+# Thời gian (giây) lưu response của một Idempotency-Key để trả lại
+IDEMPOTENCY_KEY_TTL = int(os.environ.get('IDEMPOTENCY_KEY_TTL', 86400))
+
+# Cạnh dài nhất (pixel) của ảnh recipe sau khi xử lý
+RECIPE_IMAGE_MAX_SIZE = int(os.environ.get('RECIPE_IMAGE_MAX_SIZE', 2048))
+# Ảnh đang xử lý quá thời gian này (giây) được coi như worker đã chết và
+# được xử lý lại
+IMAGE_PROCESSING_TIMEOUT = int(
+    os.environ.get('IMAGE_PROCESSING_TIMEOUT', 600)
+)
+# Ảnh không còn recipe nào dùng quá thời gian này (giây) mới bị xóa
+IMAGE_BLOB_GRACE_PERIOD = int(os.environ.get('IMAGE_BLOB_GRACE_PERIOD', 86400))
+
 SPECTACULAR_SETTINGS = {
     'COMPONENT_SPLIT_REQUEST': True
 }
\ No newline at end of file
@@ -19,8 +19,6 @@ from drf_spectacular.views import (
 )
 from django.contrib import admin
 from django.urls import path, include
-from django.conf.urls.static import static
-from django.conf import settings
 
 
 urlpatterns = [
@@ -47,9 +45,3 @@ urlpatterns = [
             'recipe.urls',
             namespace='recipe'))
 ]
-
-if settings.DEBUG:
-    urlpatterns += static(
-        settings.MEDIA_URL,
-        document_root=settings.MEDIA_ROOT,
-    )
\ No newline at end of file
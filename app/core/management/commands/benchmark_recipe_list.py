@@ -0,0 +1,156 @@
+"""
+Django command to benchmark the recipe list serializer against its
+values() projection.
+"""
+import time
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Prefetch
+
+from rest_framework.renderers import JSONRenderer
+
+from core.models import Ingredient, Recipe, Tag
+from recipe.projections import SerializerProjection
+from recipe.serializers import RecipeSerializer
+
+
+class Command(BaseCommand):
+    """Django command to compare the two ways of building the recipe list."""
+    help = (
+        'Create a throwaway dataset, then time building and rendering pages '
+        'of the recipe list with RecipeSerializer and with the values() '
+        'projection used by the API. The dataset is rolled back at the end.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recipes',
+            type=int,
+            default=1000,
+            help='Number of recipes in the dataset.',
+        )
+        parser.add_argument(
+            '--tags',
+            type=int,
+            default=3,
+            help='Number of tags per recipe.',
+        )
+        parser.add_argument(
+            '--ingredients',
+            type=int,
+            default=5,
+            help='Number of ingredients per recipe.',
+        )
+        parser.add_argument(
+            '--page-size',
+            type=int,
+            nargs='+',
+            default=[50, 100],
+            help='Page sizes to benchmark.',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=15,
+            help='Number of runs per page size, the best one is reported.',
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        if min(
+            options['recipes'], options['repeat'], *options['page_size'],
+        ) < 1 or min(options['tags'], options['ingredients']) < 0:
+            raise CommandError('Sizes and counts must be positive.')
+
+        with transaction.atomic():
+            user = self._create_dataset(
+                options['recipes'], options['tags'], options['ingredients'],
+            )
+            self.stdout.write(
+                f'{options["recipes"]} recipes with {options["tags"]} tags '
+                f'and {options["ingredients"]} ingredients each, best of '
+                f'{options["repeat"]} runs:'
+            )
+            for page_size in options['page_size']:
+                self._run(user, page_size, options['repeat'])
+            transaction.set_rollback(True)
+
+    def _create_dataset(self, recipes, tags, ingredients):
+        """Create a user owning the benchmark recipes."""
+        user = get_user_model().objects.create_user(
+            email='benchmark-recipe-list@example.com',
+            password=None,
+        )
+        tag_objs = Tag.objects.bulk_create(
+            [Tag(user=user, name=f'Tag {i}') for i in range(tags * 4)]
+        )
+        ingredient_objs = Ingredient.objects.bulk_create([
+            Ingredient(user=user, name=f'Ingredient {i}')
+            for i in range(ingredients * 4)
+        ])
+        recipe_objs = Recipe.objects.bulk_create([
+            Recipe(
+                user=user,
+                title=f'Recipe {i}',
+                time_minutes=10 + i % 50,
+                price=Decimal('5.50'),
+                link=f'https://example.com/{i}',
+            )
+            for i in range(recipes)
+        ])
+        for field, objs, count in (
+            (Recipe.tags, tag_objs, tags),
+            (Recipe.ingredients, ingredient_objs, ingredients),
+        ):
+            through = field.through
+            column = field.field.m2m_reverse_field_name()
+            through.objects.bulk_create([
+                through(recipe_id=recipe.id, **{
+                    f'{column}_id': objs[(i + j) % len(objs)].id,
+                })
+                for i, recipe in enumerate(recipe_objs)
+                for j in range(count)
+            ], batch_size=5000)
+        return user
+
+    def _run(self, user, page_size, repeat):
+        """Time one page of the list with both ways and compare them."""
+        queryset = Recipe.objects.filter(user=user).order_by('-id')
+        renderer = JSONRenderer()
+
+        def with_serializer():
+            page = queryset.prefetch_related(
+                Prefetch('tags', queryset=Tag.objects.order_by('id')),
+                Prefetch(
+                    'ingredients',
+                    queryset=Ingredient.objects.order_by('id'),
+                ),
+            )[:page_size]
+            return renderer.render(RecipeSerializer(page, many=True).data)
+
+        def with_projection():
+            projection = SerializerProjection(RecipeSerializer())
+            rows = list(projection.values(queryset)[:page_size])
+            return renderer.render(projection.to_representation(rows))
+
+        if with_serializer() != with_projection():
+            raise CommandError('The two outputs differ.')
+
+        rates = []
+        for build in (with_serializer, with_projection):
+            best = min(self._time(build) for _ in range(repeat))
+            rates.append(1 / best)
+        self.stdout.write(
+            f'  page_size={page_size}: serializer {rates[0]:.1f} pages/s, '
+            f'projection {rates[1]:.1f} pages/s '
+            f'({rates[1] / rates[0]:.1f}x)'
+        )
+
+    @staticmethod
+    def _time(build):
+        start = time.perf_counter()
+        build()
+        return time.perf_counter() - start
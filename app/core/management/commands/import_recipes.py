@@ -0,0 +1,339 @@
+"""
+Django command to import recipes from JSONL or CSV files.
+"""
+import csv
+import io
+import json
+import os
+import time
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from core.models import ImportBatch, normalize_name
+from recipe.cache import bump_cache_version
+
+# Bảng trung gian được import: (tên, bảng đích, bảng trung gian, cột)
+RELATIONS = (
+    ('tags', 'core_tag', 'core_recipe_tags', 'tag_id'),
+    ('ingredients', 'core_ingredient', 'core_recipe_ingredients',
+     'ingredient_id'),
+)
+RECIPE_COLUMNS = (
+    'id', 'user_id', 'title', 'description', 'time_minutes', 'price', 'link',
+)
+# Ngăn cách các tên trong cột tags/ingredients của file CSV
+CSV_NAME_SEPARATOR = '|'
+
+
+def staging_tables():
+    """Tên các bảng tạm dùng để COPY dữ liệu vào."""
+    tables = ['import_recipe']
+    for name, *_ in RELATIONS:
+        tables += [f'import_{name}', f'import_recipe_{name}']
+    return ', '.join(tables)
+
+
+def staging_sql():
+    """Tạo các bảng tạm nhận dữ liệu từ COPY, tồn tại hết session."""
+    sql = ["""
+    CREATE TEMP TABLE IF NOT EXISTS import_recipe (
+        id bigint, user_id bigint, title varchar(255), description text,
+        time_minutes integer, price numeric(5, 2), link varchar(255)
+    );
+    """]
+    for name, *_ in RELATIONS:
+        sql.append(f"""
+        CREATE TEMP TABLE IF NOT EXISTS import_{name} (
+            user_id bigint, name varchar(255)
+        );
+        CREATE TEMP TABLE IF NOT EXISTS import_recipe_{name} (
+            recipe_id bigint, user_id bigint, name varchar(255)
+        );
+        """)
+    return ''.join(sql)
+
+
+def merge_sql():
+    """Ghi dữ liệu của các bảng tạm vào các bảng thật theo tập."""
+    sql = []
+    for name, table, _, _ in RELATIONS:
+        sql.append(f"""
+        INSERT INTO {table} (user_id, name, usage_count)
+        SELECT user_id, name, 0 FROM import_{name}
+        ON CONFLICT (user_id, lower(name)) DO NOTHING;
+        """)
+    columns = ', '.join(RECIPE_COLUMNS)
+    # search_vector do trigger tính, usage_count do trigger của bảng
+    # trung gian cập nhật
+    sql.append(f"""
+    INSERT INTO core_recipe ({columns}, image_status, updated_at)
+    SELECT {columns}, '', now() FROM import_recipe;
+    """)
+    # Tên được loại trùng bằng lower() của Python, khác lower() của
+    # PostgreSQL ở một số ký tự ('İ', 'Σ'), nên hai tên vẫn có thể trỏ về
+    # cùng một dòng
+    for name, table, through, column in RELATIONS:
+        sql.append(f"""
+        INSERT INTO {through} (recipe_id, {column})
+        SELECT DISTINCT staged.recipe_id, target.id
+        FROM import_recipe_{name} AS staged
+        JOIN {table} AS target
+            ON target.user_id = staged.user_id
+            AND lower(target.name) = lower(staged.name)
+        ON CONFLICT (recipe_id, {column}) DO NOTHING;
+        """)
+    return ''.join(sql)
+
+
+def copy_rows(cursor, table, rows):
+    """Nạp các dòng vào bảng bằng một lệnh COPY."""
+    buffer = io.StringIO()
+    # Đặt mọi giá trị trong ngoặc kép để COPY không đọc chuỗi rỗng thành NULL
+    csv.writer(buffer, quoting=csv.QUOTE_ALL).writerows(rows)
+    buffer.seek(0)
+    cursor.copy_expert(f'COPY {table} FROM STDIN WITH (FORMAT csv)', buffer)
+
+
+class Command(BaseCommand):
+    """Django command to import recipes in batches."""
+    help = (
+        'Import recipes with their tags and ingredients from a JSONL or CSV '
+        'file. Each batch is committed on its own and recorded, so running '
+        'the command again on the same file resumes after the last batch.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='JSONL or CSV file to import.')
+        parser.add_argument(
+            '--format',
+            choices=['jsonl', 'csv'],
+            help='Input format, guessed from the file extension by default.',
+        )
+        parser.add_argument(
+            '--user',
+            help='Email of the owner of records without a "user" field.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Number of records committed per batch.',
+        )
+        parser.add_argument(
+            '--source',
+            help='Name the progress is recorded under, the path by default.',
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Ignore the recorded progress and import from the start.',
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'File not found: {path}')
+        fmt = options['format'] or (
+            'csv' if path.lower().endswith('.csv') else 'jsonl'
+        )
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be positive.')
+        self.default_user = options['user']
+        self.user_ids = {}
+        source = options['source'] or os.path.abspath(path)[-255:]
+
+        batches = ImportBatch.objects.filter(source=source)
+        if options['restart']:
+            batches.delete()
+        position = max(batches.values_list('end', flat=True), default=0)
+        if position:
+            self.stdout.write(f'Resuming after record {position}.')
+
+        records = islice(self._read(path, fmt), position, None)
+        imported = skipped = 0
+        started = time.monotonic()
+        with connection.cursor() as cursor:
+            cursor.execute(staging_sql())
+            try:
+                while True:
+                    batch = list(islice(records, batch_size))
+                    if not batch:
+                        break
+                    end = position + len(batch)
+                    count = self._import_batch(
+                        cursor, source, position, end, batch, fmt,
+                    )
+                    imported += count
+                    skipped += len(batch) - count
+                    position = end
+                    if options['verbosity'] >= 1:
+                        elapsed = max(time.monotonic() - started, 1e-6)
+                        self.stdout.write(
+                            f'{position} records read, {imported} recipes '
+                            f'imported, {skipped} skipped '
+                            f'({imported / elapsed:.0f}/s)'
+                        )
+            finally:
+                cursor.execute(f'DROP TABLE IF EXISTS {staging_tables()}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {imported} recipes, skipped {skipped} records.'
+        ))
+
+    def _read(self, path, fmt):
+        """Yield the raw records of the file one at a time."""
+        if fmt == 'csv':
+            with open(path, newline='', encoding='utf-8') as f:
+                yield from csv.DictReader(f)
+        else:
+            with open(path, encoding='utf-8') as f:
+                yield from f
+
+    def _import_batch(self, cursor, source, start, end, batch, fmt):
+        """Import one batch in its own transaction, return recipe count."""
+        recipes = []
+        for number, record in enumerate(batch, start + 1):
+            try:
+                recipe = self._clean(record, fmt)
+            except (ValueError, InvalidOperation) as e:
+                self.stderr.write(f'Record {number}: {e}')
+                continue
+            if recipe is not None:
+                recipes.append(recipe)
+
+        self._resolve_users(recipes)
+        recipes = [r for r in recipes if r['user'] in self.user_ids]
+
+        with transaction.atomic():
+            cursor.execute(f'TRUNCATE {staging_tables()}')
+            if recipes:
+                self._stage(cursor, recipes)
+                cursor.execute(merge_sql())
+            ImportBatch.objects.create(
+                source=source,
+                start=start,
+                end=end,
+                imported=len(recipes),
+                skipped=len(batch) - len(recipes),
+            )
+            for user_id in {self.user_ids[r['user']] for r in recipes}:
+                bump_cache_version(user_id)
+        return len(recipes)
+
+    def _resolve_users(self, recipes):
+        """Look up the ids of the owners not seen in earlier batches."""
+        emails = {r['user'] for r in recipes} - set(self.user_ids)
+        if not emails:
+            return
+        self.user_ids.update(
+            get_user_model().objects.filter(email__in=emails)
+            .values_list('email', 'id')
+        )
+        for email in sorted(emails - set(self.user_ids)):
+            self.stderr.write(f'Unknown user {email}, records skipped.')
+
+    def _stage(self, cursor, recipes):
+        """Copy the batch into the staging tables."""
+        # Cấp trước id cho recipe để liên kết tags/ingredients khi COPY
+        cursor.execute(
+            "SELECT nextval(pg_get_serial_sequence('core_recipe', 'id')) "
+            "FROM generate_series(1, %s)",
+            [len(recipes)],
+        )
+        ids = [row[0] for row in cursor.fetchall()]
+
+        rows = []
+        for recipe_id, recipe in zip(ids, recipes):
+            recipe['id'] = recipe_id
+            recipe['user_id'] = self.user_ids[recipe['user']]
+            rows.append([recipe[column] for column in RECIPE_COLUMNS])
+        copy_rows(cursor, 'import_recipe', rows)
+
+        for name, *_ in RELATIONS:
+            # Loại bỏ tên trùng (không phân biệt hoa thường) của từng user
+            # trong bộ nhớ trước khi COPY
+            names = {}
+            for recipe in recipes:
+                for value in recipe[name]:
+                    names.setdefault(
+                        (recipe['user_id'], value.lower()),
+                        (recipe['user_id'], value),
+                    )
+            copy_rows(cursor, f'import_{name}', names.values())
+            copy_rows(cursor, f'import_recipe_{name}', (
+                (recipe['id'], recipe['user_id'], value)
+                for recipe in recipes
+                for value in recipe[name]
+            ))
+
+    def _clean(self, record, fmt):
+        """Validate a raw record like the recipe API does.
+
+        Returns None for blank JSONL lines, raises ValueError otherwise.
+        """
+        if fmt == 'jsonl':
+            if not record.strip():
+                return None
+            record = json.loads(record)
+            if not isinstance(record, dict):
+                raise ValueError('Must be a JSON object.')
+
+        user = record.get('user') or self.default_user
+        if not user:
+            raise ValueError('No user given, use --user or a "user" field.')
+
+        title = str(record.get('title') or '').strip()
+        if not 3 <= len(title) <= 255:
+            raise ValueError('Title must be 3 to 255 characters long.')
+
+        for field in ('time_minutes', 'price'):
+            if record.get(field) in (None, ''):
+                raise ValueError(f'{field} is required.')
+
+        time_minutes = int(record['time_minutes'])
+        if time_minutes <= 0:
+            raise ValueError('time_minutes must be greater than 0.')
+
+        price = Decimal(str(record['price']).strip())
+        if not 0 <= price < 1000 or price != price.quantize(Decimal('.01')):
+            raise ValueError('price must be between 0 and 999.99.')
+
+        link = str(record.get('link') or '').strip()
+        if len(link) > 255 or (link and not link.startswith('http')):
+            raise ValueError('link must be an http(s) URL.')
+
+        recipe = {
+            'user': get_user_model().objects.normalize_email(user),
+            'title': title,
+            'description': str(record.get('description') or ''),
+            'time_minutes': time_minutes,
+            'price': price,
+            'link': link,
+        }
+        for name, *_ in RELATIONS:
+            recipe[name] = self._clean_names(record.get(name), name)
+        return recipe
+
+    def _clean_names(self, value, field):
+        """Return the distinct tag/ingredient names of a record."""
+        if not value:
+            return []
+        if isinstance(value, str):
+            value = value.split(CSV_NAME_SEPARATOR)
+        names = {}
+        for item in value:
+            if isinstance(item, dict):
+                item = item.get('name')
+            name = normalize_name(str(item or ''))
+            if not name or len(name) > 255:
+                raise ValueError(
+                    f'{field} names must be 1 to 255 characters long.'
+                )
+            names.setdefault(name.lower(), name)
+        return list(names.values())
@@ -0,0 +1,115 @@
+"""
+Django command to merge tags and ingredients whose names only differ by
+case or whitespace.
+"""
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from recipe.cache import bump_cache_version
+
+# (bảng, bảng trung gian, cột trong bảng trung gian)
+TABLES = (
+    ('core_tag', 'core_recipe_tags', 'tag_id'),
+    ('core_ingredient', 'core_recipe_ingredients', 'ingredient_id'),
+)
+# Giống normalize_name: bỏ khoảng trắng ở hai đầu và gộp khoảng trắng giữa
+NORMALIZED = "regexp_replace(btrim(name), '\\s+', ' ', 'g')"
+
+
+def merge_sql(table, through, column):
+    """Return SQL merging the names of the users in %(user_ids)s.
+
+    Rows are grouped by user and lower-cased normalized name. References
+    in the through table are moved to the lowest id of each group before
+    the other rows are deleted, and the kept names are normalized.
+    Returns the users whose data changed with their number of merged rows.
+    """
+    return f"""
+        CREATE TEMP TABLE name_merge AS
+        SELECT id, user_id, name, {NORMALIZED} AS normalized, min(id) OVER (
+            PARTITION BY user_id, lower({NORMALIZED})
+        ) AS keep_id
+        FROM {table} WHERE user_id = ANY(%(user_ids)s);
+
+        DELETE FROM name_merge WHERE id = keep_id AND name = normalized;
+
+        UPDATE core_recipe SET updated_at = now()
+        WHERE id IN (
+            SELECT r.recipe_id FROM {through} r
+            JOIN name_merge m ON m.id = r.{column}
+        );
+
+        INSERT INTO {through} (recipe_id, {column})
+        SELECT r.recipe_id, m.keep_id
+        FROM {through} r JOIN name_merge m ON m.id = r.{column}
+        WHERE m.id <> m.keep_id
+        ON CONFLICT (recipe_id, {column}) DO NOTHING;
+
+        DELETE FROM {through} r USING name_merge m
+        WHERE m.id = r.{column} AND m.id <> m.keep_id;
+
+        DELETE FROM {table} t USING name_merge m
+        WHERE m.id = t.id AND m.id <> m.keep_id;
+
+        UPDATE {table} t SET name = m.normalized FROM name_merge m
+        WHERE m.id = t.id AND m.id = m.keep_id;
+
+        SELECT user_id, count(*) FILTER (WHERE id <> keep_id)
+        FROM name_merge GROUP BY user_id;
+    """
+
+
+class Command(BaseCommand):
+    """Django command to merge duplicate tag and ingredient names."""
+    help = (
+        'Merge the tags and ingredients of each user whose names only '
+        'differ by case or whitespace, moving their recipes to one row. '
+        'Users are processed in batches, each in its own transaction.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of users merged per transaction.',
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be positive.')
+
+        user_ids = get_user_model().objects.order_by('id').values_list(
+            'id', flat=True,
+        ).iterator(chunk_size=batch_size)
+        changed = merged = 0
+        while True:
+            batch = list(islice(user_ids, batch_size))
+            if not batch:
+                break
+            with transaction.atomic(), connection.cursor() as cursor:
+                users = set()
+                for table, through, column in TABLES:
+                    cursor.execute(
+                        merge_sql(table, through, column),
+                        {'user_ids': batch},
+                    )
+                    for user_id, count in cursor.fetchall():
+                        users.add(user_id)
+                        merged += count
+                    cursor.execute('DROP TABLE name_merge')
+                for user_id in users:
+                    bump_cache_version(user_id)
+            changed += len(users)
+            self.stdout.write(
+                f'Users up to id {batch[-1]}: {merged} rows merged'
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Merged {merged} duplicate rows of {changed} users.'
+        ))
@@ -0,0 +1,107 @@
+"""
+Django command to process uploaded recipe images in the background.
+"""
+import multiprocessing
+import sys
+import time
+import traceback
+
+from django.core.management.base import (
+    BaseCommand,
+    CommandError,
+    OutputWrapper,
+)
+from django.db import connection, connections
+
+from recipe.images import claim_image, process_image
+
+
+def run_worker(once, poll_interval, stdout, stderr):
+    """Process queued images until the queue is empty when `once` is set,
+    otherwise forever. Return the number of processed images.
+    """
+    count = 0
+    while True:
+        recipe = claim_image()
+        if recipe is None:
+            if once:
+                return count
+            time.sleep(poll_interval)
+            continue
+
+        try:
+            result = process_image(recipe)
+        except Exception:
+            # Ảnh vẫn ở trạng thái processing và được xử lý lại sau
+            # IMAGE_PROCESSING_TIMEOUT, worker tiếp tục với ảnh khác
+            stderr.write(f'Recipe {recipe.id}: {traceback.format_exc()}')
+            continue
+        count += 1
+        stdout.write(f'Recipe {recipe.id}: {result or "superseded"}')
+
+
+def _run_process(once, poll_interval):
+    """Run `run_worker` in a worker process on its own connection."""
+    try:
+        return run_worker(
+            once,
+            poll_interval,
+            OutputWrapper(sys.stdout),
+            OutputWrapper(sys.stderr),
+        )
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    """Django command to process the recipe image queue."""
+    help = (
+        'Decode, resize and store the recipe images uploaded through the '
+        'API. Workers claim queued images from the database, so several '
+        'instances of this command can run at once.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Number of processes processing images in parallel.',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit when the queue is empty instead of waiting.',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=2.0,
+            help='Seconds to wait before checking an empty queue again.',
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        workers = options['workers']
+        once = options['once']
+        poll_interval = options['poll_interval']
+        if workers < 1 or poll_interval <= 0:
+            raise CommandError(
+                '--workers and --poll-interval must be positive.'
+            )
+
+        if workers == 1:
+            count = run_worker(once, poll_interval, self.stdout, self.stderr)
+        else:
+            # Process con không được dùng chung kết nối database với process
+            # cha
+            connections.close_all()
+            context = multiprocessing.get_context('fork')
+            with context.Pool(workers) as pool:
+                results = [
+                    pool.apply_async(_run_process, (once, poll_interval))
+                    for _ in range(workers)
+                ]
+                count = sum(result.get() for result in results)
+
+        self.stdout.write(self.style.SUCCESS(f'Processed {count} images.'))
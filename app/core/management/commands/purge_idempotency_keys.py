@@ -0,0 +1,51 @@
+"""
+Django command to delete expired idempotency keys.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    """Django command to purge idempotency keys older than their TTL."""
+    help = (
+        'Delete stored Idempotency-Key responses older than '
+        'IDEMPOTENCY_KEY_TTL, in batches. Meant to be run periodically, '
+        'e.g. from cron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=10000,
+            help='Number of keys deleted per statement.',
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be positive.')
+
+        expired = IdempotencyKey.objects.filter(
+            created_at__lte=timezone.now() - timedelta(
+                seconds=settings.IDEMPOTENCY_KEY_TTL,
+            ),
+        )
+        deleted = 0
+        while True:
+            # Xóa từng batch để không giữ lock lâu trên bảng
+            ids = list(expired.values_list('id', flat=True)[:batch_size])
+            if not ids:
+                break
+            count, _ = IdempotencyKey.objects.filter(id__in=ids).delete()
+            deleted += count
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {deleted} expired idempotency keys.'
+        ))
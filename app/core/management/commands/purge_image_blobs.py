@@ -0,0 +1,79 @@
+"""
+Django command to delete recipe images no recipe uses anymore.
+"""
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import ImageBlob, Recipe
+from recipe.images import blob_directory, blob_lock, variant_files
+
+
+class Command(BaseCommand):
+    """Django command to purge unused image blobs and their files."""
+    help = (
+        'Delete the stored images that no recipe has used for longer than '
+        'IMAGE_BLOB_GRACE_PERIOD, in batches. Meant to be run periodically, '
+        'e.g. from cron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of blobs deleted per transaction.',
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be positive.')
+
+        unused = ImageBlob.objects.filter(
+            ref_count=0,
+            updated_at__lt=timezone.now() - timedelta(
+                seconds=settings.IMAGE_BLOB_GRACE_PERIOD,
+            ),
+        )
+        storage = Recipe._meta.get_field('image').storage
+        deleted = 0
+        while True:
+            with transaction.atomic():
+                # Blob đang được gắn vào recipe bị khóa và được bỏ qua
+                blobs = list(
+                    unused.select_for_update(skip_locked=True)
+                    .order_by('updated_at')
+                    .values_list('id', 'sha256', 'variants')[:batch_size]
+                )
+                if not blobs:
+                    break
+                ImageBlob.objects.filter(
+                    id__in=[blob_id for blob_id, _, _ in blobs],
+                    ref_count=0,
+                ).delete()
+
+            # File chỉ bị xóa sau khi blob đã bị xóa khỏi database. Cùng nội
+            # dung được upload lại sau đó thì process_image tạo blob mới với
+            # đúng các tên file này, nên giữ lock của sha256 và bỏ qua nếu
+            # blob mới đã có
+            for _, sha256, variants in blobs:
+                with blob_lock(sha256):
+                    if ImageBlob.objects.filter(sha256=sha256).exists():
+                        continue
+                    for name in variant_files(variants):
+                        storage.delete(name)
+                    try:
+                        os.rmdir(storage.path(blob_directory(sha256)))
+                    except OSError:
+                        pass
+            deleted += len(blobs)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {deleted} unused image blobs.'
+        ))
@@ -0,0 +1,29 @@
+# Indexes used to filter recipes by tags and ingredients.
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_recipe_image'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=(
+                'CREATE INDEX core_recipe_tags_tag_id_recipe_id_idx '
+                'ON core_recipe_tags (tag_id, recipe_id);'
+            ),
+            reverse_sql='DROP INDEX core_recipe_tags_tag_id_recipe_id_idx;',
+        ),
+        migrations.RunSQL(
+            sql=(
+                'CREATE INDEX core_recipe_ingredients_ingredient_id_recipe_id_idx '
+                'ON core_recipe_ingredients (ingredient_id, recipe_id);'
+            ),
+            reverse_sql=(
+                'DROP INDEX core_recipe_ingredients_ingredient_id_recipe_id_idx;'
+            ),
+        ),
+    ]
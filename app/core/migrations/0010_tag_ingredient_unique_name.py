@@ -0,0 +1,59 @@
+# Generated by Django 3.2.25 on 2026-10-18 06:01
+
+from django.db import migrations, models
+
+
+def merge_duplicates_sql(table, column):
+    """Return SQL merging rows of `table` with the same user and name.
+
+    References in the recipe through table are moved to the row with the
+    lowest id before the duplicates are deleted.
+    """
+    duplicates = f"""
+        SELECT id, min(id) OVER (PARTITION BY user_id, name) AS keep_id
+        FROM {table}
+    """
+    through = f'core_recipe_{column}s'
+    # Kiểm tra khóa ngoại ngay để ALTER TABLE sau đó không bị chặn bởi
+    # các trigger đang chờ
+    return f"""
+        SET CONSTRAINTS ALL IMMEDIATE;
+
+        INSERT INTO {through} (recipe_id, {column}_id)
+        SELECT r.recipe_id, d.keep_id
+        FROM {through} r JOIN ({duplicates}) d ON d.id = r.{column}_id
+        WHERE d.id <> d.keep_id
+        ON CONFLICT (recipe_id, {column}_id) DO NOTHING;
+
+        DELETE FROM {through} r USING ({duplicates}) d
+        WHERE d.id = r.{column}_id AND d.id <> d.keep_id;
+
+        DELETE FROM {table} t USING ({duplicates}) d
+        WHERE d.id = t.id AND d.id <> d.keep_id;
+    """
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_recipe_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=merge_duplicates_sql('core_ingredient', 'ingredient'),
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.RunSQL(
+            sql=merge_duplicates_sql('core_tag', 'tag'),
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('user', 'name'), name='core_ingredient_user_name_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='tag',
+            constraint=models.UniqueConstraint(fields=('user', 'name'), name='core_tag_user_name_uniq'),
+        ),
+    ]
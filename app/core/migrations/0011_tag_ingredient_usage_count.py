@@ -0,0 +1,93 @@
+# Generated by Django 3.2.25 on 2026-10-18 06:07
+
+from django.db import migrations, models
+
+
+def usage_count_sql(table, column):
+    """Trigger theo câu lệnh giữ usage_count khớp với bảng trung gian."""
+    through = f'core_recipe_{table[len("core_"):]}s'
+    function = f'{table}_usage_count_update'
+    return f"""
+CREATE FUNCTION {function}() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        UPDATE {table} SET usage_count = {table}.usage_count - changed.n
+        FROM (SELECT {column}, count(*) AS n FROM old_rows
+              GROUP BY {column}) AS changed
+        WHERE {table}.id = changed.{column};
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        UPDATE {table} SET usage_count = {table}.usage_count + changed.n
+        FROM (SELECT {column}, count(*) AS n FROM new_rows
+              GROUP BY {column}) AS changed
+        WHERE {table}.id = changed.{column};
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER {table}_usage_count_insert
+    AFTER INSERT ON {through}
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE PROCEDURE {function}();
+CREATE TRIGGER {table}_usage_count_delete
+    AFTER DELETE ON {through}
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE PROCEDURE {function}();
+CREATE TRIGGER {table}_usage_count_update
+    AFTER UPDATE ON {through}
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE PROCEDURE {function}();
+
+LOCK TABLE {through} IN SHARE MODE;
+UPDATE {table} SET usage_count = counts.n
+FROM (SELECT {column}, count(*) AS n FROM {through}
+      GROUP BY {column}) AS counts
+WHERE {table}.id = counts.{column};
+"""
+
+
+def reverse_usage_count_sql(table):
+    through = f'core_recipe_{table[len("core_"):]}s'
+    return f"""
+DROP TRIGGER {table}_usage_count_insert ON {through};
+DROP TRIGGER {table}_usage_count_delete ON {through};
+DROP TRIGGER {table}_usage_count_update ON {through};
+DROP FUNCTION {table}_usage_count_update();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_tag_ingredient_unique_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='usage_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='usage_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['user', 'usage_count'], name='core_ingred_user_id_0292ab_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['user', 'usage_count'], name='core_tag_user_id_1c5412_idx'),
+        ),
+        migrations.RunSQL(
+            sql=usage_count_sql('core_ingredient', 'ingredient_id'),
+            reverse_sql=reverse_usage_count_sql('core_ingredient'),
+        ),
+        migrations.RunSQL(
+            sql=usage_count_sql('core_tag', 'tag_id'),
+            reverse_sql=reverse_usage_count_sql('core_tag'),
+        ),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 3.2.25 on 2026-10-18 06:19
+
+from django.db import migrations
+
+
+def lower_name_index_sql(table, column):
+    """Return SQL merging names that only differ by case or whitespace.
+
+    Names are normalized to single spaces, references in the recipe
+    through table are moved to the row with the lowest id and a unique
+    index on (user_id, lower(name)) is created.
+    """
+    through = f'core_recipe_{column}s'
+    normalized = "regexp_replace(btrim(name), '\\s+', ' ', 'g')"
+    return f"""
+        SET CONSTRAINTS ALL IMMEDIATE;
+
+        CREATE TEMP TABLE {table}_merge AS
+        SELECT id, name, {normalized} AS normalized, min(id) OVER (
+            PARTITION BY user_id, lower({normalized})
+        ) AS keep_id
+        FROM {table};
+
+        UPDATE core_recipe SET updated_at = now()
+        WHERE id IN (
+            SELECT r.recipe_id FROM {through} r
+            JOIN {table}_merge m ON m.id = r.{column}_id
+            WHERE m.id <> m.keep_id OR m.name <> m.normalized
+        );
+
+        INSERT INTO {through} (recipe_id, {column}_id)
+        SELECT r.recipe_id, m.keep_id
+        FROM {through} r JOIN {table}_merge m ON m.id = r.{column}_id
+        WHERE m.id <> m.keep_id
+        ON CONFLICT (recipe_id, {column}_id) DO NOTHING;
+
+        DELETE FROM {through} r USING {table}_merge m
+        WHERE m.id = r.{column}_id AND m.id <> m.keep_id;
+
+        DELETE FROM {table} t USING {table}_merge m
+        WHERE m.id = t.id AND m.id <> m.keep_id;
+
+        UPDATE {table} t SET name = m.normalized FROM {table}_merge m
+        WHERE m.id = t.id AND m.name <> m.normalized;
+
+        DROP TABLE {table}_merge;
+
+        CREATE UNIQUE INDEX {table}_user_lower_name_uniq
+        ON {table} (user_id, lower(name));
+    """
+
+
+def reverse_lower_name_index_sql(table):
+    return f'DROP INDEX {table}_user_lower_name_uniq;'
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_importbatch'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=lower_name_index_sql('core_ingredient', 'ingredient'),
+            reverse_sql=reverse_lower_name_index_sql('core_ingredient'),
+        ),
+        migrations.RunSQL(
+            sql=lower_name_index_sql('core_tag', 'tag'),
+            reverse_sql=reverse_lower_name_index_sql('core_tag'),
+        ),
+        migrations.RemoveConstraint(
+            model_name='ingredient',
+            name='core_ingredient_user_name_uniq',
+        ),
+        migrations.RemoveConstraint(
+            model_name='tag',
+            name='core_tag_user_name_uniq',
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 3.2.25 on 2026-10-18 06:27
+
+import core.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_metadata',
+            field=models.JSONField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='image_status',
+            field=models.CharField(blank=True, choices=[('pending', 'Pending'), ('processing', 'Processing'), ('ready', 'Ready'), ('failed', 'Failed')], default='', editable=False, max_length=10),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='image_status_at',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='image_upload',
+            field=models.FileField(editable=False, null=True, upload_to=core.models.recipe_upload_file_path),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(condition=models.Q(('image_status__in', ['pending', 'processing'])), fields=['image_status_at'], name='core_recipe_image_queue_idx'),
+        ),
+        # Ảnh upload trước khi có hàng đợi đã được xử lý trong request
+        migrations.RunSQL(
+            "UPDATE core_recipe SET image_status = 'ready' "
+            "WHERE image IS NOT NULL AND image <> ''",
+            migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 3.2.25 on 2026-10-18 06:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_recipe_image_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_variants',
+            field=models.JSONField(editable=False, null=True),
+        ),
+        # Đưa các ảnh đã có lại vào hàng đợi để lệnh process_images tạo các
+        # kích thước, ảnh hiện tại được dùng làm file gốc
+        migrations.RunSQL(
+            "UPDATE core_recipe SET image_upload = image, "
+            "image_status = 'pending', image_status_at = now() "
+            "WHERE image IS NOT NULL AND image <> '' "
+            "AND image_status = 'ready'",
+            migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,102 @@
+# Generated by Django 3.2.25 on 2026-10-18 06:36
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def ref_count_update_sql(rows):
+    """Cộng vào ref_count của mỗi blob tổng `n` của nó trong `rows`."""
+    return f"""
+        UPDATE core_imageblob
+        SET ref_count = core_imageblob.ref_count + changed.n,
+            updated_at = now()
+        FROM (
+            SELECT image_blob_id, sum(n) AS n FROM ({rows}) AS rows
+            WHERE image_blob_id IS NOT NULL
+            GROUP BY image_blob_id
+            HAVING sum(n) <> 0
+        ) AS changed
+        WHERE core_imageblob.id = changed.image_blob_id;"""
+
+
+# Với UPDATE, số recipe bớt và thêm của mỗi blob được gộp lại nên câu UPDATE
+# recipe không đổi blob (thường gặp nhất) không ghi vào blob dùng chung bởi
+# nhiều recipe.
+REF_COUNT_SQL = f"""
+CREATE FUNCTION core_imageblob_ref_count_update() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN{ref_count_update_sql(
+        'SELECT image_blob_id, 1 AS n FROM new_rows'
+    )}
+    ELSIF TG_OP = 'DELETE' THEN{ref_count_update_sql(
+        'SELECT image_blob_id, -1 AS n FROM old_rows'
+    )}
+    ELSE{ref_count_update_sql(
+        'SELECT image_blob_id, -1 AS n FROM old_rows '
+        'UNION ALL SELECT image_blob_id, 1 FROM new_rows'
+    )}
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER core_imageblob_ref_count_insert
+    AFTER INSERT ON core_recipe
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE PROCEDURE core_imageblob_ref_count_update();
+CREATE TRIGGER core_imageblob_ref_count_delete
+    AFTER DELETE ON core_recipe
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE PROCEDURE core_imageblob_ref_count_update();
+CREATE TRIGGER core_imageblob_ref_count_update
+    AFTER UPDATE ON core_recipe
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE PROCEDURE core_imageblob_ref_count_update();
+"""
+
+REVERSE_REF_COUNT_SQL = """
+DROP TRIGGER core_imageblob_ref_count_insert ON core_recipe;
+DROP TRIGGER core_imageblob_ref_count_delete ON core_recipe;
+DROP TRIGGER core_imageblob_ref_count_update ON core_recipe;
+DROP FUNCTION core_imageblob_ref_count_update();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_recipe_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64, unique=True)),
+                ('variants', models.JSONField()),
+                ('metadata', models.JSONField()),
+                ('ref_count', models.IntegerField(default=0, editable=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='imageblob',
+            index=models.Index(condition=models.Q(('ref_count', 0)), fields=['updated_at'], name='core_imageblob_unused_idx'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='image_blob',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, to='core.imageblob'),
+        ),
+        migrations.RunSQL(REF_COUNT_SQL, REVERSE_REF_COUNT_SQL),
+        # Các ảnh đã xử lý được đưa lại vào hàng đợi để chuyển sang blob,
+        # ảnh JPEG lớn nhất hiện tại được dùng làm file gốc
+        migrations.RunSQL(
+            "UPDATE core_recipe SET image_upload = image, "
+            "image_status = 'pending', image_status_at = now() "
+            "WHERE image IS NOT NULL AND image <> '' "
+            "AND image_status = 'ready'",
+            migrations.RunSQL.noop,
+        ),
+    ]
@@ -5,6 +5,9 @@ import uuid
 import os
 
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.contrib.auth.models import (
     AbstractBaseUser,
@@ -12,6 +15,15 @@ from django.contrib.auth.models import (
     PermissionsMixin,
 )
 
+# Cấu hình full-text search, dùng 'simple' vì tiêu đề có nhiều ngôn ngữ
+RECIPE_SEARCH_CONFIG = 'simple'
+
+
+def normalize_name(name):
+    """Bỏ khoảng trắng thừa trong tên tag/ingredient."""
+    return ' '.join(name.split())
+
+
 def recipe_image_file_path(instance, filename):
     """Generate file path for new recipe image."""
     ext = os.path.splitext(filename)[1]
@@ -19,6 +31,14 @@ def recipe_image_file_path(instance, filename):
 
     return os.path.join('uploads', 'recipe', filename)
 
+
+def recipe_upload_file_path(instance, filename):
+    """Generate file path for an uploaded image waiting to be processed."""
+    ext = os.path.splitext(filename)[1]
+    filename = f'{uuid.uuid4()}{ext}'
+
+    return os.path.join('uploads', 'recipe', 'raw', filename)
+
 # Định nghĩa schema database
 # Quản lý relatiionships giữa các models
 # Cung cấp methods tạo/sửa/xóa records
@@ -61,6 +81,14 @@ class User(AbstractBaseUser, PermissionsMixin):
     USERNAME_FIELD = 'email'
 
 
+class ImageStatus(models.TextChoices):
+    """Trạng thái xử lý ảnh của recipe."""
+    PENDING = 'pending'
+    PROCESSING = 'processing'
+    READY = 'ready'
+    FAILED = 'failed'
+
+
 class Recipe(models.Model):
     "Recipe object."
     user = models.ForeignKey(
@@ -80,6 +108,50 @@ class Recipe(models.Model):
     tags = models.ManyToManyField('Tag')
     ingredients = models.ManyToManyField('Ingredient')
     image = models.ImageField(null=True, upload_to=recipe_image_file_path)
+    # File gốc người dùng gửi lên, chờ lệnh process_images xử lý thành image
+    image_upload = models.FileField(
+        null=True,
+        editable=False,
+        upload_to=recipe_upload_file_path,
+    )
+    image_status = models.CharField(
+        max_length=10,
+        choices=ImageStatus.choices,
+        blank=True,
+        default='',
+        editable=False,
+    )
+    # Thời điểm chuyển sang trạng thái hiện tại, dùng làm thứ tự hàng đợi
+    image_status_at = models.DateTimeField(null=True, editable=False)
+    # Kích thước, định dạng của ảnh đã xử lý hoặc lỗi khi xử lý
+    image_metadata = models.JSONField(null=True, editable=False)
+    # Danh sách các kích thước đã resize, mỗi phần tử gồm name, width,
+    # height và đường dẫn file theo từng định dạng (jpeg, webp)
+    image_variants = models.JSONField(null=True, editable=False)
+    # Blob chứa các file ảnh, image_variants và image_metadata được chép từ
+    # blob để đọc recipe không cần join
+    image_blob = models.ForeignKey(
+        'ImageBlob',
+        null=True,
+        editable=False,
+        on_delete=models.PROTECT,
+    )
+    # Được trigger trong database cập nhật từ title và description
+    search_vector = SearchVectorField(null=True, editable=False)
+    # Cũng được cập nhật khi tags/ingredients của recipe thay đổi
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector']),
+            models.Index(fields=['user', 'updated_at']),
+            # Chỉ chứa các ảnh đang chờ/đang xử lý nên luôn nhỏ
+            models.Index(
+                fields=['image_status_at'],
+                name='core_recipe_image_queue_idx',
+                condition=models.Q(image_status__in=['pending', 'processing']),
+            ),
+        ]
 
     def __str__(self):
         return self.title
@@ -90,23 +162,133 @@ class Recipe(models.Model):
 # Gắn tag cho công thức
 
 
-class Tag(models.Model):
+class UsageCountMixin:
+    """Không ghi đè `usage_count` khi save một object đã có.
+
+    `usage_count` là số recipe đang dùng object, được trigger trên bảng
+    trung gian cập nhật. Giá trị trong Python có thể đã cũ nên chỉ các cột
+    còn lại được ghi.
+    """
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'usage_count'
+            ]
+        super().save(*args, **kwargs)
+
+
+class Tag(UsageCountMixin, models.Model):
     """Tag for filtering recipes."""
     name = models.CharField(max_length=255)
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
     )
+    usage_count = models.IntegerField(default=0, editable=False)
+
+    class Meta:
+        # Tên là duy nhất theo user không phân biệt hoa thường, bằng unique
+        # index trên (user_id, lower(name)) tạo trong migration 0013
+        indexes = [
+            models.Index(fields=['user', 'usage_count']),
+        ]
 
     def __str__(self):
         return self.name
-class Ingredient(models.Model):
+
+
+class Ingredient(UsageCountMixin, models.Model):
     """Ingredient for recipe"""
     name = models.CharField(max_length=255)
     user= models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
     )
+    usage_count = models.IntegerField(default=0, editable=False)
+
+    class Meta:
+        # Tên là duy nhất theo user không phân biệt hoa thường, bằng unique
+        # index trên (user_id, lower(name)) tạo trong migration 0013
+        indexes = [
+            models.Index(fields=['user', 'usage_count']),
+        ]
+
+    def __str__(self):
+        return self.name
+
+
+class ImportBatch(models.Model):
+    """Batch đã import xong của lệnh import_recipes, dùng để chạy tiếp."""
+    source = models.CharField(max_length=255)
+    # Vị trí [start, end) của các record trong file nguồn
+    start = models.PositiveIntegerField()
+    end = models.PositiveIntegerField()
+    imported = models.PositiveIntegerField()
+    skipped = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['source', 'start'],
+                name='core_importbatch_source_start_uniq',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.source} [{self.start}, {self.end})'
+
+
+class IdempotencyKey(models.Model):
+    """Response đã trả cho một Idempotency-Key, được trả lại khi gửi lại."""
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+    )
+    key = models.CharField(max_length=255)
+    # sha256 của method, path và dữ liệu request
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField()
+    response = models.JSONField(encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'key'],
+                name='core_idempotencykey_user_key_uniq',
+            ),
+        ]
+
+    def __str__(self):
+        return self.key
+
+
+class ImageBlob(models.Model):
+    """Ảnh đã xử lý, lưu một lần cho mỗi nội dung file gốc.
+
+    Các recipe upload cùng một file dùng chung blob và các file của nó.
+    """
+    # sha256 của file gốc, cũng là thư mục chứa các file
+    sha256 = models.CharField(max_length=64, unique=True)
+    variants = models.JSONField()
+    metadata = models.JSONField()
+    # Số recipe đang dùng blob, được trigger trên core_recipe cập nhật
+    ref_count = models.IntegerField(default=0, editable=False)
+    # Trigger cũng cập nhật cột này khi ref_count thay đổi
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Blob không còn được dùng, chờ lệnh purge_image_blobs xóa
+            models.Index(
+                fields=['updated_at'],
+                name='core_imageblob_unused_idx',
+                condition=models.Q(ref_count=0),
+            ),
+        ]
 
     def __str__(self):
-        return self.name
\ No newline at end of file
+        return self.sha256
@@ -2,13 +2,47 @@
 Test custom Django management commands
 """
 
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+import gzip
 from unittest.mock import patch
+import json
+import os
+import tempfile
 
+from PIL import Image
 from psycopg2 import OperationalError as Psycopg2Error
 
-from django.core.management import call_command
+from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchQuery
+from django.core.files.base import ContentFile
+from django.core.management import call_command, CommandError
+from django.db import connection
 from django.db.utils import OperationalError
-from django.test import SimpleTestCase
+from django.utils import timezone
+from django.test import (
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+
+from core.management.commands.import_recipes import Command
+from core.models import (
+    IdempotencyKey,
+    ImageBlob,
+    ImageStatus,
+    ImportBatch,
+    Ingredient,
+    Recipe,
+    Tag,
+)
+from recipe import images
+from recipe.images import claim_image, process_image, variant_files
+from recipe.projections import SerializerProjection
+from recipe.serializers import RecipeDetailSerializer
 
 
 @patch('core.management.commands.wait_for_db.Command.check')
@@ -33,3 +67,574 @@ class CommandTests(SimpleTestCase):
 
         self.assertEqual(patched_check.call_count, 6)
         patched_check.assert_called_with(databases=['default'])
+
+
+class ImportRecipesTests(TestCase):
+    """Test the import_recipes command."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='testpass123',
+        )
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _write(self, name, content):
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        return path
+
+    def _jsonl(self, records):
+        return self._write(
+            'recipes.jsonl', ''.join(json.dumps(r) + '\n' for r in records),
+        )
+
+    def _import(self, path, **options):
+        stdout, stderr = StringIO(), StringIO()
+        call_command(
+            'import_recipes', path, stdout=stdout, stderr=stderr, **options,
+        )
+        return stderr.getvalue()
+
+    def test_import_jsonl(self):
+        """Test importing recipes with tags and ingredients."""
+        Tag.objects.create(user=self.user, name='Dinner')
+        path = self._jsonl([
+            {
+                'user': self.user.email,
+                'title': 'Thai curry',
+                'time_minutes': 30,
+                'price': '5.50',
+                'description': 'Spicy',
+                'tags': ['Dinner', 'Thai', 'Thai'],
+                'ingredients': [{'name': 'Rice'}],
+            },
+            {
+                'user': self.user.email,
+                'title': 'Pad thai',
+                'time_minutes': 20,
+                'price': 4,
+                'tags': ['Thai'],
+            },
+        ])
+
+        self._import(path)
+
+        recipes = Recipe.objects.filter(user=self.user).order_by('id')
+        self.assertEqual(
+            [r.title for r in recipes], ['Thai curry', 'Pad thai'],
+        )
+        self.assertEqual(recipes[0].description, 'Spicy')
+        self.assertEqual(recipes[1].price, Decimal('4.00'))
+        self.assertEqual(
+            set(recipes[0].tags.values_list('name', flat=True)),
+            {'Dinner', 'Thai'},
+        )
+        tags = Tag.objects.filter(user=self.user)
+        self.assertEqual(
+            dict(tags.values_list('name', 'usage_count')),
+            {'Dinner': 1, 'Thai': 2},
+        )
+        self.assertEqual(Ingredient.objects.get().name, 'Rice')
+        self.assertTrue(Recipe.objects.filter(
+            search_vector=SearchQuery('curry', config='simple'),
+        ).exists())
+
+    def test_import_names_folded_differently(self):
+        """Test names Python and PostgreSQL lowercase differently."""
+        path = self._jsonl([
+            {'user': self.user.email, 'title': 'Fish', 'time_minutes': 5,
+             'price': '1.00', 'tags': ['İzmir', 'izmir'],
+             'ingredients': ['ΨΑΡΟΣ', 'ψαρος']},
+        ])
+
+        self._import(path)
+
+        recipe = Recipe.objects.get()
+        self.assertEqual(recipe.tags.count(), 1)
+        self.assertEqual(recipe.ingredients.count(), 1)
+        self.assertEqual(Tag.objects.get().usage_count, 1)
+
+    def test_import_csv_default_user(self):
+        """Test importing a CSV file for the --user owner."""
+        path = self._write('recipes.csv', (
+            'title,time_minutes,price,link,tags,ingredients\n'
+            'Salad,5,2.50,https://example.com,Lunch|Vegan,"Kale|Salt"\n'
+            'Soup,15,3,,,\n'
+        ))
+
+        self._import(path, user=self.user.email)
+
+        recipes = Recipe.objects.filter(user=self.user).order_by('id')
+        self.assertEqual([r.title for r in recipes], ['Salad', 'Soup'])
+        self.assertEqual(recipes[0].link, 'https://example.com')
+        self.assertEqual(recipes[1].link, '')
+        self.assertEqual(recipes[0].ingredients.count(), 2)
+        self.assertEqual(recipes[1].tags.count(), 0)
+
+    def test_import_skips_invalid_records(self):
+        """Test invalid records and unknown users are reported."""
+        path = self._jsonl([
+            {'user': self.user.email, 'title': 'Ok recipe',
+             'time_minutes': 5, 'price': '1.00'},
+            {'user': self.user.email, 'title': 'No',
+             'time_minutes': 5, 'price': '1.00'},
+            {'user': self.user.email, 'title': 'Bad price',
+             'time_minutes': 5, 'price': '1.005'},
+            {'user': 'nobody@example.com', 'title': 'Unknown user',
+             'time_minutes': 5, 'price': '1.00'},
+        ])
+
+        errors = self._import(path)
+
+        self.assertEqual(
+            list(Recipe.objects.values_list('title', flat=True)),
+            ['Ok recipe'],
+        )
+        self.assertIn('Record 2', errors)
+        self.assertIn('Record 3', errors)
+        self.assertIn('nobody@example.com', errors)
+        batch = ImportBatch.objects.get()
+        self.assertEqual((batch.imported, batch.skipped), (1, 3))
+
+    def test_import_ids_above_integer_range(self):
+        """Test importing rows whose ids do not fit in a 32 bit integer."""
+        user = get_user_model().objects.create_user(
+            id=2 ** 31 + 5,
+            email='big@example.com',
+            password='testpass123',
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT setval(pg_get_serial_sequence('core_recipe', 'id'), "
+                "%s)",
+                [2 ** 31],
+            )
+        path = self._jsonl([
+            {'user': user.email, 'title': 'Big soup', 'time_minutes': 5,
+             'price': '1.00', 'tags': ['Soup'], 'ingredients': ['Salt']},
+        ])
+
+        self._import(path)
+
+        recipe = Recipe.objects.get(user=user)
+        self.assertGreater(recipe.id, 2 ** 31)
+        self.assertEqual(list(recipe.tags.values_list('name', flat=True)),
+                         ['Soup'])
+        self.assertEqual(recipe.ingredients.get().user, user)
+
+    def test_import_resumes_after_last_batch(self):
+        """Test running the import again skips the committed batches."""
+        records = [
+            {'user': self.user.email, 'title': f'Recipe {i}',
+             'time_minutes': 5, 'price': '1.00', 'tags': ['Common']}
+            for i in range(5)
+        ]
+        path = self._jsonl(records)
+
+        stage = Command._stage
+        calls = []
+
+        def fail_third_batch(command, *args):
+            calls.append(args)
+            if len(calls) == 3:
+                raise RuntimeError('Connection lost')
+            return stage(command, *args)
+
+        with patch.object(Command, '_stage', fail_third_batch):
+            with self.assertRaises(RuntimeError):
+                self._import(path, batch_size=2)
+        self.assertEqual(Recipe.objects.count(), 4)
+
+        self._import(path, batch_size=2)
+
+        self.assertEqual(Recipe.objects.count(), 5)
+        self.assertEqual(ImportBatch.objects.count(), 3)
+        self.assertEqual(Tag.objects.get().usage_count, 5)
+
+        self._import(path, batch_size=2, restart=True)
+
+        self.assertEqual(Recipe.objects.count(), 10)
+
+
+class ExportRecipesTests(TransactionTestCase):
+    """Test the export_recipes command."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='testpass123',
+        )
+        self.other = get_user_model().objects.create_user(
+            email='other@example.com',
+            password='testpass123',
+        )
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'recipes.ndjson.gz')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _create_recipes(self, user, count):
+        tag = Tag.objects.create(user=user, name='Dinner')
+        recipes = []
+        for i in range(count):
+            recipe = Recipe.objects.create(
+                user=user, title=f'Recipe {i}', time_minutes=5, price='1.00',
+            )
+            recipe.tags.add(tag)
+            recipes.append(recipe)
+        return recipes
+
+    def _export(self, *args):
+        call_command('export_recipes', self.path, *args, stdout=StringIO())
+        with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+            return [json.loads(line) for line in f]
+
+    def test_export_recipes(self):
+        """Test every recipe is exported with its owner."""
+        recipes = self._create_recipes(self.user, 3)
+        self._create_recipes(self.other, 2)
+
+        lines = self._export('--chunk-size', '2')
+
+        self.assertEqual(len(lines), 5)
+        expected = dict(RecipeDetailSerializer(recipes[0]).data)
+        self.assertEqual(lines[0], {'user': self.user.email, **expected})
+
+    def test_export_streams_in_transaction(self):
+        """Test rows are not read through a holdable cursor."""
+        self._create_recipes(self.user, 3)
+        iterate = SerializerProjection.iterate
+        holdable = []
+
+        def checked(projection, rows, chunk_size):
+            for item in iterate(projection, rows, chunk_size):
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        'SELECT coalesce(bool_or(is_holdable), false) '
+                        'FROM pg_cursors'
+                    )
+                    holdable.append(cursor.fetchone()[0])
+                yield item
+
+        with patch.object(SerializerProjection, 'iterate', checked):
+            lines = self._export('--chunk-size', '2')
+
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(holdable, [False] * 3)
+
+    def test_export_users(self):
+        """Test exporting only the recipes of the given users."""
+        self._create_recipes(self.user, 2)
+        self._create_recipes(self.other, 2)
+
+        lines = self._export('--users', self.other.email)
+
+        self.assertEqual(
+            {line['user'] for line in lines}, {self.other.email},
+        )
+        self.assertEqual(len(lines), 2)
+
+    def test_export_unknown_user(self):
+        """Test exporting for an unknown user is an error."""
+        with self.assertRaises(CommandError):
+            call_command('export_recipes', self.path, '--users', 'x@y.com')
+
+    def test_export_parallel(self):
+        """Test workers export the id ranges into one ordered file."""
+        recipes = self._create_recipes(self.user, 7)
+
+        lines = self._export('--workers', '3')
+
+        self.assertEqual(
+            [line['id'] for line in lines], [r.id for r in recipes],
+        )
+
+
+class MergeDuplicateNamesTests(TestCase):
+    """Test the merge_duplicate_names command."""
+
+    def test_merge_duplicate_names(self):
+        """Test tags differing by spaces are merged into the first one."""
+        user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='testpass123',
+        )
+        keep = Tag.objects.create(user=user, name='Vegan')
+        duplicate = Tag.objects.create(user=user, name=' vegan  ')
+        spaced = Tag.objects.create(user=user, name='Very  spicy')
+        ingredient = Ingredient.objects.create(user=user, name='Salt ')
+        recipes = [
+            Recipe.objects.create(
+                user=user, title=f'Recipe {i}', time_minutes=5, price='1.00',
+            )
+            for i in range(2)
+        ]
+        recipes[0].tags.add(keep, duplicate)
+        recipes[1].tags.add(duplicate, spaced)
+        recipes[1].ingredients.add(ingredient)
+
+        call_command('merge_duplicate_names', stdout=StringIO())
+
+        self.assertFalse(Tag.objects.filter(id=duplicate.id).exists())
+        self.assertEqual(
+            sorted(Tag.objects.values_list('name', 'usage_count')),
+            [('Vegan', 2), ('Very spicy', 1)],
+        )
+        for recipe in recipes:
+            self.assertIn(keep, recipe.tags.all())
+        ingredient.refresh_from_db()
+        self.assertEqual(ingredient.name, 'Salt')
+
+
+class PurgeIdempotencyKeysTests(TestCase):
+    """Test the purge_idempotency_keys command."""
+
+    @override_settings(IDEMPOTENCY_KEY_TTL=3600)
+    def test_purge_expired_keys(self):
+        """Test only keys older than the TTL are deleted."""
+        user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='testpass123',
+        )
+        for key in ('old-1', 'old-2', 'new'):
+            IdempotencyKey.objects.create(
+                user=user, key=key, fingerprint='x',
+                status_code=201, response={},
+            )
+        IdempotencyKey.objects.exclude(key='new').update(
+            created_at=timezone.now() - timedelta(hours=2),
+        )
+
+        call_command(
+            'purge_idempotency_keys', '--batch-size', '1', stdout=StringIO(),
+        )
+
+        self.assertEqual(
+            list(IdempotencyKey.objects.values_list('key', flat=True)),
+            ['new'],
+        )
+
+
+class ProcessImagesTests(TestCase):
+    """Test the process_images command."""
+
+    def setUp(self):
+        user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='testpass123',
+        )
+        self.recipe = Recipe.objects.create(
+            user=user, title='Soup', time_minutes=10, price=Decimal('1.00'),
+        )
+
+    def tearDown(self):
+        self.recipe.refresh_from_db()
+        for name in variant_files(self.recipe.image_variants):
+            self.recipe.image.storage.delete(name)
+        self.recipe.image.delete()
+        self.recipe.image_upload.delete()
+
+    def _queue(self, content, recipe=None):
+        recipe = recipe or self.recipe
+        recipe.image_upload.save('upload.jpg', ContentFile(content))
+        Recipe.objects.filter(id=recipe.id).update(
+            image_status=ImageStatus.PENDING,
+            image_status_at=timezone.now(),
+        )
+
+    def test_invalid_image_fails(self):
+        """Test a file that is not an image is marked as failed."""
+        self._queue(b'not an image')
+        path = self.recipe.image_upload.path
+
+        call_command('process_images', '--once', stdout=StringIO())
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, ImageStatus.FAILED)
+        self.assertIn('error', self.recipe.image_metadata)
+        self.assertFalse(self.recipe.image)
+        self.assertFalse(os.path.exists(path))
+
+    def test_newer_upload_wins(self):
+        """Test the result of a replaced upload is dropped."""
+        self._queue(b'not an image')
+        recipe = claim_image()
+        self._queue(b'another upload')
+
+        self.assertIsNone(process_image(recipe))
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, ImageStatus.PENDING)
+
+    @override_settings(IMAGE_PROCESSING_TIMEOUT=60)
+    def test_stale_claim_is_retried(self):
+        """Test images claimed by a dead worker are claimed again."""
+        self._queue(b'not an image')
+        self.assertIsNotNone(claim_image())
+        self.assertIsNone(claim_image())
+
+        Recipe.objects.filter(id=self.recipe.id).update(
+            image_status_at=timezone.now() - timedelta(minutes=2),
+        )
+
+        self.assertEqual(claim_image().id, self.recipe.id)
+
+    def test_small_image_shares_files(self):
+        """Test sizes larger than the original reuse the same files."""
+        output = BytesIO()
+        Image.new('RGB', (50, 40)).save(output, format='PNG')
+        self._queue(output.getvalue())
+
+        call_command('process_images', '--once', stdout=StringIO())
+
+        self.recipe.refresh_from_db()
+        variants = self.recipe.image_variants
+        self.assertEqual(
+            [variant['name'] for variant in variants],
+            ['full', 'card', 'thumbnail'],
+        )
+        self.assertEqual(variants[0]['jpeg'], variants[2]['jpeg'])
+        self.assertEqual(self.recipe.image.name, variants[0]['jpeg'])
+
+    def test_requeued_image_is_replaced(self):
+        """Test an image queued again as its own upload gets variants."""
+        output = BytesIO()
+        Image.new('RGB', (50, 40)).save(output, format='JPEG')
+        self._queue(output.getvalue())
+        old = self.recipe.image_upload.name
+        Recipe.objects.filter(id=self.recipe.id).update(image=old)
+
+        call_command('process_images', '--once', stdout=StringIO())
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, ImageStatus.READY)
+        self.assertNotEqual(self.recipe.image.name, old)
+        self.assertFalse(self.recipe.image.storage.exists(old))
+
+    def test_same_content_is_rendered_once(self):
+        """Test recipes uploading the same bytes share one blob."""
+        output = BytesIO()
+        Image.new('RGB', (50, 40)).save(output, format='JPEG')
+        other = Recipe.objects.create(
+            user=self.recipe.user, title='Stew', time_minutes=10,
+            price=Decimal('1.00'),
+        )
+        self._queue(output.getvalue())
+        self._queue(output.getvalue(), recipe=other)
+
+        with patch(
+            'recipe.images.render_image', side_effect=images.render_image,
+        ) as render:
+            call_command('process_images', '--once', stdout=StringIO())
+
+        render.assert_called_once()
+        blob = ImageBlob.objects.get()
+        self.assertEqual(blob.ref_count, 2)
+        self.recipe.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(other.image_status, ImageStatus.READY)
+        self.assertEqual(other.image.name, self.recipe.image.name)
+        self.assertFalse(other.image_upload)
+
+        other.delete()
+        blob.refresh_from_db()
+        self.assertEqual(blob.ref_count, 1)
+
+
+class PurgeImageBlobsTests(TestCase):
+    """Test the purge_image_blobs command."""
+
+    @override_settings(IMAGE_BLOB_GRACE_PERIOD=3600)
+    def test_purge_unused_blobs(self):
+        """Test only blobs unused for longer than the grace period go."""
+        user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='testpass123',
+        )
+        storage = Recipe._meta.get_field('image').storage
+        blobs = {}
+        for name, digit in (('used', 'a'), ('unused', 'b'), ('recent', 'c')):
+            sha256 = digit * 64
+            path = storage.save(
+                os.path.join(images.blob_directory(sha256), 'full.jpg'),
+                ContentFile(b'image'),
+            )
+            blobs[name] = ImageBlob.objects.create(
+                sha256=sha256,
+                variants=[{'name': 'full', 'jpeg': path}],
+                metadata={},
+            )
+        Recipe.objects.create(
+            user=user, title='Soup', time_minutes=10, price=Decimal('1.00'),
+            image_blob=blobs['used'],
+        )
+        ImageBlob.objects.exclude(id=blobs['recent'].id).update(
+            updated_at=timezone.now() - timedelta(hours=2),
+        )
+
+        call_command('purge_image_blobs', stdout=StringIO())
+
+        self.assertEqual(
+            set(ImageBlob.objects.values_list('id', flat=True)),
+            {blobs['used'].id, blobs['recent'].id},
+        )
+        self.assertFalse(storage.exists(blobs['unused'].variants[0]['jpeg']))
+        for name in ('used', 'recent'):
+            path = blobs[name].variants[0]['jpeg']
+            self.assertTrue(storage.exists(path))
+            storage.delete(path)
+
+    def test_purge_keeps_files_of_recreated_blob(self):
+        """Test files are kept when the same content got a new blob."""
+        storage = Recipe._meta.get_field('image').storage
+        sha256 = 'f' * 64
+        path = storage.save(
+            os.path.join(images.blob_directory(sha256), 'full.jpg'),
+            ContentFile(b'image'),
+        )
+        variants = [{'name': 'full', 'jpeg': path}]
+        ImageBlob.objects.create(sha256=sha256, variants=variants, metadata={})
+        ImageBlob.objects.update(
+            updated_at=timezone.now() - timedelta(hours=2),
+        )
+        blob_lock = images.blob_lock
+
+        @contextmanager
+        def upload_again(sha256):
+            # Worker xử lý lại cùng nội dung ngay sau khi blob bị xóa
+            ImageBlob.objects.create(
+                sha256=sha256, variants=variants, metadata={},
+            )
+            with blob_lock(sha256):
+                yield
+
+        with patch(
+            'core.management.commands.purge_image_blobs.blob_lock',
+            upload_again,
+        ):
+            call_command('purge_image_blobs', stdout=StringIO())
+
+        self.assertTrue(storage.exists(path))
+        storage.delete(path)
+
+
+class BenchmarkRecipeListTests(TestCase):
+    """Test the recipe list benchmark command."""
+
+    def test_benchmark_leaves_no_data(self):
+        """Test the benchmark reports both ways and rolls back its data."""
+        out = StringIO()
+
+        call_command(
+            'benchmark_recipe_list', '--recipes', '20', '--page-size', '10',
+            '--repeat', '1', stdout=out,
+        )
+
+        self.assertIn('page_size=10: serializer', out.getvalue())
+        self.assertFalse(Recipe.objects.exists())
+        self.assertFalse(get_user_model().objects.exists())
@@ -4,6 +4,7 @@ Test for models.
 from unittest.mock import patch
 from decimal import Decimal
 
+from django.db import IntegrityError
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 
@@ -81,6 +82,16 @@ class ModelTests(TestCase):
 
         self.assertEqual(str(tag), tag.name)
 
+    def test_tag_name_unique_per_user(self):
+        """Test a user cannot have two tags with the same name in any case."""
+        user = create_user()
+        models.Tag.objects.create(user=user, name='Tag1')
+        other = create_user(email='other@example.com')
+        models.Tag.objects.create(user=other, name='Tag1')
+
+        with self.assertRaises(IntegrityError):
+            models.Tag.objects.create(user=user, name='tag1')
+
     def test_create_ingredient(self):
         """Test creating an ingredient is successful."""
         user = create_user()
@@ -0,0 +1,74 @@
+"""
+Per-user versioned cache for the recipe APIs.
+
+Every cached response is keyed by the user and the user's current cache
+version. Writes only bump the version, which makes all older entries of
+that user unreachable without having to find and delete them.
+"""
+import functools
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+
+from rest_framework.response import Response
+
+
+def _version_key(user_id):
+    return f'recipe:version:{user_id}'
+
+
+def get_cache_version(user_id):
+    """Return the current cache version of a user."""
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        # Khởi tạo bằng timestamp để không dùng lại version đã bị xóa khỏi
+        # cache trước đó
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def _incr_cache_version(user_id):
+    try:
+        cache.incr(_version_key(user_id))
+    except ValueError:
+        # Chưa có version thì lần đọc tiếp theo sẽ tạo version mới
+        pass
+
+
+def bump_cache_version(user_id):
+    """Invalidate every cached response of a user."""
+    _incr_cache_version(user_id)
+    if connection.in_atomic_block:
+        # Bump lại sau commit, tránh response đọc trước commit bị cache
+        # với version mới
+        transaction.on_commit(lambda: _incr_cache_version(user_id))
+
+
+def response_cache_key(request):
+    """Return the cache key of a request for the current cache version."""
+    user_id = request.user.pk
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f'recipe:response:{user_id}:{get_cache_version(user_id)}:{path}'
+
+
+def cache_response(view_method):
+    """Cache the data of successful responses of a viewset action."""
+
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = response_cache_key(request)
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+
+        response = view_method(self, request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, settings.RECIPE_CACHE_TIMEOUT)
+        return response
+
+    return wrapper
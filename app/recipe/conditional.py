@@ -0,0 +1,53 @@
+"""
+Conditional GET support for the recipe APIs.
+"""
+import functools
+import hashlib
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+def make_etag(request, *parts):
+    """Return a strong ETag for the representation of a request."""
+    # Cùng dữ liệu nhưng khác path/định dạng thì body cũng khác
+    parts += (request.get_full_path(), request.accepted_media_type)
+    digest = hashlib.md5(':'.join(map(str, parts)).encode()).hexdigest()
+    return quote_etag(digest)
+
+
+def conditional_response(validators):
+    """Answer conditional GETs before the viewset action runs.
+
+    `validators` names a viewset method returning an (etag, last_modified)
+    pair for the request, or None when the action should run normally.
+    """
+
+    def decorator(view_method):
+
+        @functools.wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            result = getattr(self, validators)(request, *args, **kwargs)
+            if result is None:
+                return view_method(self, request, *args, **kwargs)
+
+            etag, last_modified = result
+            timestamp = last_modified and int(last_modified.timestamp())
+            response = get_conditional_response(
+                request,
+                etag=etag,
+                last_modified=timestamp,
+            )
+            if response is None:
+                response = view_method(self, request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+
+            response['ETag'] = etag
+            if timestamp:
+                response['Last-Modified'] = http_date(timestamp)
+            return response
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,42 @@
+"""
+Set-based deletion for the recipe APIs.
+
+`QuerySet.delete()` loads every object into Django's collector because the
+models have delete signals. Bulk deletes instead remove the link rows and
+the objects with one DELETE per table and update the affected recipes with
+one UPDATE, so the cost does not grow with the number of objects.
+"""
+from django.db import router, transaction
+
+from core.models import Recipe
+from recipe.signals import touch_recipes
+
+
+def bulk_delete(model, ids):
+    """Delete the objects of `model` with the given ids.
+
+    Recipe tags/ingredients link rows are removed first. Recipes that lose
+    a tag/ingredient are marked as modified. Delete signals are not sent,
+    so the caller has to invalidate cached responses. Returns the number of
+    deleted objects.
+    """
+    if not ids:
+        return 0
+
+    using = router.db_for_write(model)
+    with transaction.atomic(using=using):
+        for relation in Recipe._meta.many_to_many:
+            through = relation.remote_field.through
+            if model is Recipe:
+                column = relation.m2m_field_name()
+            elif relation.related_model is model:
+                column = relation.m2m_reverse_name()
+            else:
+                continue
+
+            rows = through.objects.filter(**{f'{column}__in': ids})
+            if model is not Recipe:
+                touch_recipes(rows.values('recipe_id'))
+            rows._raw_delete(using)
+
+        return model.objects.filter(id__in=ids)._raw_delete(using)
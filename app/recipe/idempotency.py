@@ -0,0 +1,124 @@
+"""
+Idempotency-Key support for the recipe APIs.
+
+A write sent with an `Idempotency-Key` header runs at most once per user
+and key: a repeated request gets the stored response back instead of
+running the action again. Requests with the same key are serialized with a
+transaction-level advisory lock, so a retry sent while the first request
+is still running waits for it and then replays its response.
+"""
+import functools
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.db import connection, transaction
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.response import Response
+
+from core.models import IdempotencyKey
+
+IDEMPOTENCY_KEY_HEADER = 'Idempotency-Key'
+
+
+class IdempotencyKeyReused(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = (
+        f'{IDEMPOTENCY_KEY_HEADER} was already used for a different request.'
+    )
+    default_code = 'idempotency_key_reused'
+
+
+def _describe(value):
+    # File chỉ được nhận diện qua tên, kích thước và sha256 nếu đã được tính
+    # khi upload, không đọc lại nội dung
+    if isinstance(value, UploadedFile):
+        sha256 = getattr(value, 'sha256', None)
+        digest = f':{sha256.hexdigest()}' if sha256 is not None else ''
+        return f'{value.name}:{value.size}{digest}'
+    return str(value)
+
+
+def request_fingerprint(request):
+    """Return a digest of the method, path and data of a request."""
+    data = request.data
+    if hasattr(data, 'lists'):
+        data = {
+            key: [_describe(value) for value in values]
+            for key, values in data.lists()
+        }
+    payload = json.dumps(
+        [request.method, request.path, data],
+        sort_keys=True,
+        default=_describe,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _lock_id(user_id, key):
+    digest = hashlib.sha256(f'{user_id}:{key}'.encode()).digest()
+    return int.from_bytes(digest[:8], 'big', signed=True)
+
+
+def idempotent(view_method):
+    """Replay the stored response of a repeated `Idempotency-Key`.
+
+    Only successful responses are stored, a request that failed can be
+    retried with the same key.
+    """
+
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_KEY_HEADER)
+        if not key:
+            return view_method(self, request, *args, **kwargs)
+        if len(key) > 255:
+            raise ValidationError(
+                {IDEMPOTENCY_KEY_HEADER: 'Must be at most 255 characters.'}
+            )
+
+        fingerprint = request_fingerprint(request)
+        expired = timezone.now() - timedelta(
+            seconds=settings.IDEMPOTENCY_KEY_TTL,
+        )
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT pg_advisory_xact_lock(%s)',
+                    [_lock_id(request.user.pk, key)],
+                )
+            stored = IdempotencyKey.objects.filter(
+                user=request.user,
+                key=key,
+                created_at__gt=expired,
+            ).first()
+            if stored is not None:
+                if stored.fingerprint != fingerprint:
+                    raise IdempotencyKeyReused()
+                return Response(
+                    stored.response,
+                    status=stored.status_code,
+                    headers={'Idempotent-Replayed': 'true'},
+                )
+
+            response = view_method(self, request, *args, **kwargs)
+            if response.status_code < 400:
+                # Ghi đè key đã hết hạn nhưng chưa bị xóa
+                IdempotencyKey.objects.update_or_create(
+                    user=request.user,
+                    key=key,
+                    defaults={
+                        'fingerprint': fingerprint,
+                        'status_code': response.status_code,
+                        'response': response.data,
+                        'created_at': timezone.now(),
+                    },
+                )
+            return response
+
+    return wrapper
@@ -0,0 +1,271 @@
+"""
+Background processing of uploaded recipe images.
+
+An upload only stores the raw file and marks the recipe `pending`. The
+`process_images` command claims queued recipes one at a time with
+`SELECT ... FOR UPDATE SKIP LOCKED`, so any number of workers can share the
+queue, then decodes, resizes and stores the image outside of the request.
+
+The resized files are stored once per content hash of the upload in an
+`ImageBlob` shared by every recipe that uploaded the same bytes. Unused
+blobs are deleted by the `purge_image_blobs` command.
+"""
+import hashlib
+import io
+import os
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from PIL import Image, ImageOps, features
+
+from core.models import ImageBlob, ImageStatus, Recipe
+from recipe.cache import bump_cache_version
+
+# Định dạng Pillow của các file được nhận khi upload, MPO là JPEG của nhiều
+# điện thoại
+UPLOAD_FORMATS = {'JPEG', 'MPO', 'PNG', 'WEBP', 'GIF'}
+# Tên và cạnh dài nhất (pixel) của các ảnh được tạo, từ lớn đến nhỏ. `full`
+# dùng RECIPE_IMAGE_MAX_SIZE
+IMAGE_SIZES = (
+    ('full', None),
+    ('card', 480),
+    ('thumbnail', 128),
+)
+# Định dạng -> (format của Pillow, đuôi file, tham số khi lưu)
+IMAGE_FORMATS = {
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'jpg', {'quality': 85, 'optimize': True}),
+}
+if not features.check('webp'):
+    # Pillow được build không có libwebp thì chỉ tạo JPEG
+    del IMAGE_FORMATS['webp']
+# Lỗi Pillow trả về cho file không phải ảnh, bị cắt hoặc quá lớn
+DECODE_ERRORS = (
+    OSError,
+    ValueError,
+    SyntaxError,
+    Image.DecompressionBombError,
+)
+
+
+def _update_status(queryset, **fields):
+    """Update the image fields of recipes without running save signals."""
+    now = timezone.now()
+    return queryset.update(image_status_at=now, updated_at=now, **fields)
+
+
+def claim_image():
+    """Mark the oldest queued image as processing and return its recipe.
+
+    Images left `processing` longer than IMAGE_PROCESSING_TIMEOUT belong to
+    a worker that died and are claimed again. Returns None when the queue
+    is empty.
+    """
+    stale = timezone.now() - timedelta(
+        seconds=settings.IMAGE_PROCESSING_TIMEOUT,
+    )
+    with transaction.atomic():
+        recipe = Recipe.objects.filter(
+            Q(image_status=ImageStatus.PENDING) |
+            Q(image_status=ImageStatus.PROCESSING, image_status_at__lt=stale)
+        ).order_by('image_status_at').only(
+            'id', 'user_id', 'image', 'image_upload', 'image_variants',
+            'image_blob_id',
+        ).select_for_update(skip_locked=True).first()
+        if recipe is None:
+            return None
+        _update_status(
+            Recipe.objects.filter(id=recipe.id),
+            image_status=ImageStatus.PROCESSING,
+        )
+        bump_cache_version(recipe.user_id)
+    return recipe
+
+
+def render_image(file):
+    """Decode an image file and return its resized variants with metadata.
+
+    Variants are `(name, image)` pairs in the order of IMAGE_SIZES, each
+    resized from the previous one. Raises one of DECODE_ERRORS for files
+    Pillow cannot decode.
+    """
+    max_size = settings.RECIPE_IMAGE_MAX_SIZE
+    with Image.open(file) as original:
+        metadata = {
+            'format': original.format,
+            'original_width': original.width,
+            'original_height': original.height,
+        }
+        # JPEG được giải mã thẳng ở độ phân giải gần với kích thước cần,
+        # nhanh hơn nhiều với ảnh chụp từ điện thoại
+        original.draft('RGB', (max_size, max_size))
+        image = ImageOps.exif_transpose(original)
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+
+    variants = []
+    for name, size in IMAGE_SIZES:
+        image = image.copy()
+        image.thumbnail((size or max_size, size or max_size))
+        variants.append((name, image))
+    metadata.update(width=variants[0][1].width, height=variants[0][1].height)
+    return variants, metadata
+
+
+def blob_directory(sha256):
+    """Return the directory of the files of the blob with `sha256`."""
+    return os.path.join('uploads', 'recipe', sha256[:2], sha256)
+
+
+def store_variants(variants, directory):
+    """Encode and save the variants in every format of IMAGE_FORMATS.
+
+    Returns the `image_variants` value of the recipe. A variant that is not
+    smaller than the previous one, because the original is already small,
+    reuses its files.
+    """
+    storage = Recipe._meta.get_field('image').storage
+    stored = []
+    for name, image in variants:
+        variant = {'name': name, 'width': image.width, 'height': image.height}
+        last = stored[-1] if stored else None
+        if last and (last['width'], last['height']) == image.size:
+            variant.update(
+                (key, value) for key, value in last.items()
+                if key in IMAGE_FORMATS
+            )
+            stored.append(variant)
+            continue
+        for key, (image_format, ext, options) in IMAGE_FORMATS.items():
+            output = io.BytesIO()
+            image.save(output, format=image_format, **options)
+            path = os.path.join(directory, f'{name}.{ext}')
+            # File còn lại của lần xử lý bị dừng giữa chừng, ghi lại để giữ
+            # đúng tên
+            storage.delete(path)
+            variant[key] = storage.save(path, ContentFile(output.getvalue()))
+        stored.append(variant)
+    return stored
+
+
+def variant_files(image_variants):
+    """Return the stored file names of an `image_variants` value."""
+    return {
+        value
+        for variant in image_variants or []
+        for key, value in variant.items()
+        if key in IMAGE_FORMATS
+    }
+
+
+def file_sha256(file):
+    """Return the sha256 hex digest of a file, read chunk by chunk."""
+    sha256 = hashlib.sha256()
+    file.seek(0)
+    for chunk in file.chunks():
+        sha256.update(chunk)
+    file.seek(0)
+    return sha256.hexdigest()
+
+
+@contextmanager
+def blob_lock(sha256):
+    """Hold a session advisory lock on a content hash.
+
+    Workers processing the same content wait for each other, so the blob is
+    only rendered once.
+    """
+    lock_id = int.from_bytes(bytes.fromhex(sha256[:16]), 'big', signed=True)
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_advisory_lock(%s)', [lock_id])
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_unlock(%s)', [lock_id])
+
+
+def locked_blob(sha256):
+    """Return the blob of `sha256` locked until the end of the transaction.
+
+    The lock keeps purge_image_blobs from deleting an unused blob that is
+    being attached to a recipe.
+    """
+    return ImageBlob.objects.select_for_update().filter(
+        sha256=sha256,
+    ).first()
+
+
+def blob_fields(blob):
+    """Return the recipe fields showing the image of a blob."""
+    return {
+        'image_blob': blob,
+        # Giữ `image` là ảnh JPEG lớn nhất cho client cũ
+        'image': blob.variants[0]['jpeg'],
+        'image_variants': blob.variants,
+        'image_metadata': blob.metadata,
+        'image_status': ImageStatus.READY,
+    }
+
+
+def process_image(recipe):
+    """Process the claimed upload of a recipe and return the new status.
+
+    An upload whose content was already processed reuses that blob without
+    decoding it again. The result is dropped when the recipe got a newer
+    upload, or another worker finished the same one, while this one was
+    processed.
+    """
+    upload = recipe.image_upload
+    storage = upload.storage
+    claimed = Recipe.objects.filter(
+        id=recipe.id,
+        image_status=ImageStatus.PROCESSING,
+        image_upload=upload.name,
+    )
+    try:
+        with upload.open('rb'):
+            sha256 = file_sha256(upload)
+            with blob_lock(sha256), transaction.atomic():
+                blob = locked_blob(sha256)
+                if blob is None:
+                    variants, metadata = render_image(upload)
+                    blob = ImageBlob.objects.create(
+                        sha256=sha256,
+                        variants=store_variants(
+                            variants, blob_directory(sha256),
+                        ),
+                        metadata=metadata,
+                    )
+                fields = blob_fields(blob)
+                updated = _update_status(
+                    claimed, image_upload=None, **fields,
+                )
+    except DECODE_ERRORS as error:
+        fields = {
+            'image_status': ImageStatus.FAILED,
+            'image_metadata': {'error': str(error)},
+        }
+        updated = _update_status(claimed, image_upload=None, **fields)
+
+    obsolete = set()
+    if updated and recipe.image_blob_id is None and 'image_blob' in fields:
+        # Ảnh từ trước khi có blob không dùng chung với recipe khác
+        obsolete = variant_files(recipe.image_variants) | {recipe.image.name}
+    # File gốc không còn được dùng, trừ khi nó chính là ảnh hiện tại (ảnh cũ
+    # được đưa lại vào hàng đợi để chuyển sang blob)
+    if upload.name != recipe.image.name:
+        obsolete.add(upload.name)
+    for name in obsolete - {'', None}:
+        storage.delete(name)
+    if not updated:
+        return None
+
+    bump_cache_version(recipe.user_id)
+    return fields['image_status']
@@ -0,0 +1,62 @@
+"""
+Access controlled serving of recipe image files.
+
+Image files are not public: their URLs point to an API endpoint that checks
+the user owns a recipe showing the file. Behind nginx the endpoint only
+answers with an `X-Accel-Redirect` header and nginx sends the file from an
+internal location, so no uwsgi worker is busy while the file is transferred.
+"""
+import mimetypes
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse
+from django.urls import reverse
+
+from core.models import Recipe
+
+# File của blob: uploads/recipe/<2 ký tự đầu>/<sha256>/<tên file>
+BLOB_FILE_RE = re.compile(
+    r'^uploads/recipe/[0-9a-f]{2}/(?P<sha256>[0-9a-f]{64})/[\w.-]+$'
+)
+# Tên file không bao giờ bị dùng lại nên client được cache lâu dài
+CACHE_CONTROL = 'private, max-age=31536000, immutable'
+
+
+def media_url(name, request=None):
+    """Return the URL of the media endpoint serving a stored file."""
+    url = reverse('recipe:media', args=[name])
+    return request.build_absolute_uri(url) if request else url
+
+
+def can_read(user, name):
+    """Return whether a recipe of `user` shows the stored file `name`."""
+    recipes = Recipe.objects.filter(user=user)
+    match = BLOB_FILE_RE.match(name)
+    if match:
+        return recipes.filter(image_blob__sha256=match['sha256']).exists()
+    # Ảnh từ trước khi có blob
+    return recipes.filter(image=name).exists()
+
+
+def media_response(name):
+    """Return a response sending the stored file `name`.
+
+    With MEDIA_ACCEL_REDIRECT_PREFIX set the file is sent by nginx,
+    otherwise Django streams it, e.g. when running without the proxy.
+    """
+    content_type, _ = mimetypes.guess_type(name)
+    prefix = settings.MEDIA_ACCEL_REDIRECT_PREFIX
+    if prefix:
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = prefix + quote(name)
+    else:
+        storage = Recipe._meta.get_field('image').storage
+        try:
+            file = storage.open(name)
+        except FileNotFoundError:
+            raise Http404()
+        response = FileResponse(file, content_type=content_type)
+    response['Cache-Control'] = CACHE_CONTROL
+    return response
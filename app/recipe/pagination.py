@@ -0,0 +1,24 @@
+"""
+Pagination for the recipe APIs.
+"""
+from django.conf import settings
+
+from rest_framework.pagination import CursorPagination
+
+
+class RecipeCursorPagination(CursorPagination):
+    """Opaque cursor pagination that follows the view ordering.
+
+    Pages are selected with a keyset condition on the first ordering field
+    instead of OFFSET, and no COUNT(*) is run, so every page costs the same.
+    """
+    page_size = settings.API_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def get_ordering(self, request, queryset, view):
+        """Return the ordering declared by the view."""
+        ordering = view.get_ordering()
+        if isinstance(ordering, str):
+            return (ordering,)
+        return tuple(ordering)
@@ -0,0 +1,129 @@
+"""
+Read-only projections for the recipe APIs.
+
+A projection builds the same output as a serializer straight from
+`values()` rows: one query for the rows and one grouped query per nested
+relation, without creating a model or serializer instance per object.
+"""
+from collections import OrderedDict
+from contextlib import contextmanager
+from itertools import islice
+
+from django.db import connection, transaction
+
+from rest_framework import serializers
+
+
+@contextmanager
+def read_snapshot():
+    """Run the block in a read-only repeatable-read transaction.
+
+    Outside a transaction Django declares server-side cursors `WITH HOLD`,
+    and PostgreSQL then computes and stores the whole result before the
+    first fetch. Inside one the rows are streamed, and the nested relations
+    fetched per chunk see the same snapshot as the rows.
+    """
+    outer = connection.in_atomic_block
+    with transaction.atomic():
+        if not outer:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, '
+                    'READ ONLY'
+                )
+        yield
+
+
+class SerializerProjection:
+    """Build the output of a model serializer from `values()` rows.
+
+    Only fields with a model column source, optionally across foreign
+    keys (`user.email`), and nested many-to-many serializers with plain
+    column fields are supported.
+    """
+
+    def __init__(self, serializer):
+        self.model = serializer.Meta.model
+        self.pk = self.model._meta.pk.attname
+        self.fields = list(serializer.fields.values())
+        # Lookup của values() cho từng field, `user.email` -> `user__email`
+        self.sources = {
+            field.field_name: '__'.join(field.source_attrs)
+            for field in self.fields
+            if not isinstance(field, serializers.ListSerializer)
+        }
+        self.columns = list(self.sources.values())
+
+    def values(self, queryset, *extra):
+        """Return the rows needed to build the output of `queryset`."""
+        columns = dict.fromkeys([self.pk, *self.columns, *extra])
+        return queryset.prefetch_related(None).values(*columns)
+
+    def _fetch_related(self, field, ids):
+        """Return the nested output of a relation grouped by object id."""
+        relation = self.model._meta.get_field(field.source)
+        through = relation.remote_field.through
+        target = relation.m2m_reverse_field_name()
+        child_fields = list(field.child.fields.values())
+
+        rows = through.objects.filter(
+            **{f'{relation.m2m_field_name()}__in': ids}
+        ).values_list(
+            relation.m2m_column_name(),
+            *[f'{target}__{child.source}' for child in child_fields],
+        ).order_by(relation.m2m_column_name(), relation.m2m_reverse_name())
+
+        related = {}
+        for object_id, *values in rows:
+            related.setdefault(object_id, []).append(
+                self._represent(zip(child_fields, values))
+            )
+        return related
+
+    @staticmethod
+    def _represent(pairs):
+        ret = OrderedDict()
+        for field, value in pairs:
+            ret[field.field_name] = (
+                None if value is None else field.to_representation(value)
+            )
+        return ret
+
+    def to_representation(self, rows):
+        """Return the serializer output for a list of `values()` rows."""
+        ids = [row[self.pk] for row in rows]
+        related = {
+            field.field_name: self._fetch_related(field, ids)
+            for field in self.fields
+            if isinstance(field, serializers.ListSerializer)
+        }
+
+        data = []
+        for row in rows:
+            ret = OrderedDict()
+            for field in self.fields:
+                if field.field_name in related:
+                    ret[field.field_name] = related[field.field_name].get(
+                        row[self.pk], [],
+                    )
+                    continue
+                value = row[self.sources[field.field_name]]
+                ret[field.field_name] = (
+                    None if value is None else field.to_representation(value)
+                )
+            data.append(ret)
+        return data
+
+    def iterate(self, rows, chunk_size):
+        """Yield the output of `rows` object by object.
+
+        Rows are read with a server-side cursor and nested relations are
+        fetched per chunk, so memory use does not grow with the row count.
+        Iterate inside `read_snapshot()` so the cursor really streams.
+        """
+        rows = rows.iterator(chunk_size=chunk_size)
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                return
+            yield from self.to_representation(chunk)
@@ -0,0 +1,15 @@
+"""
+Renderers for the recipe APIs.
+"""
+from rest_framework.renderers import JSONRenderer
+
+
+class NDJSONRenderer(JSONRenderer):
+    """Render data as one line of newline-delimited JSON."""
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return super().render(data, accepted_media_type, renderer_context) + (
+            b'\n'
+        )
@@ -1,34 +1,232 @@
+from django.db import connection, transaction
+from django.db.models import Value
+from django.db.models.functions import Lower
+from django.utils import timezone
+from PIL import Image
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema_field
 from rest_framework import serializers
-from core.models import Recipe, Tag, Ingredient
+from core.models import (
+    ImageStatus,
+    Recipe,
+    Tag,
+    Ingredient,
+    normalize_name,
+)
+from recipe.images import (
+    DECODE_ERRORS,
+    UPLOAD_FORMATS,
+    blob_fields,
+    locked_blob,
+    variant_files,
+)
+from recipe.media import media_url
 
+# Số dòng mỗi câu INSERT khi ghi hàng loạt
+BULK_BATCH_SIZE = 500
 
-class IngredientSerializer(serializers.ModelSerializer):
+
+def resolve_names(model, user, names):
+    """Trả về dict name -> object của user, tạo các name còn thiếu.
+
+    Tên được chuẩn hóa khoảng trắng và so khớp không phân biệt hoa thường,
+    giống unique index (user_id, lower(name)). Dùng một query để tìm các
+    name đã có và một bulk insert cho phần còn lại, bất kể số lượng name.
+    ignore_conflicts giúp hai request tạo cùng name không bị lỗi; dòng mà
+    request khác vừa tạo được đọc lại ở query cuối.
+    """
+    names = {normalize_name(name) for name in names}
+    if not names:
+        return {}
+    # Khóa so khớp do PostgreSQL tính như unique index: lower() của Python
+    # khác với lower() của database ở một số ký tự ngoài ASCII ('İ', 'Σ')
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT name, lower(name) FROM unnest(%s::text[]) AS name',
+            [sorted(names)],
+        )
+        keys = dict(cursor.fetchall())
+
+    def find(keys):
+        return {
+            obj.key: obj
+            for obj in model.objects.filter(user=user).annotate(
+                key=Lower('name'),
+            ).filter(key__in=keys)
+        }
+
+    objects = find(set(keys.values()))
+    # Giữ cách viết đầu tiên cho mỗi tên chưa có
+    missing = {}
+    for name in sorted(names):
+        missing.setdefault(keys[name], name)
+    for key in objects:
+        missing.pop(key, None)
+    if missing:
+        model.objects.bulk_create(
+            [model(user=user, name=name) for name in missing.values()],
+            batch_size=BULK_BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+        # ignore_conflicts không trả về id nên phải đọc lại
+        objects.update(find(set(missing)))
+    return {name: objects[keys[name]] for name in names}
+
+
+def set_related(field, targets):
+    """Gán tags/ingredients cho nhiều recipe bằng các câu lệnh theo tập.
+
+    `targets` là dict recipe id -> tập id của tag/ingredient. Chỉ xóa và
+    thêm các dòng của bảng trung gian thực sự thay đổi.
+    """
+    if not targets:
+        return
+
+    relation = Recipe._meta.get_field(field)
+    through = relation.remote_field.through
+    column = relation.m2m_reverse_name()
+
+    current = set()
+    stale = []
+    rows = through.objects.filter(recipe_id__in=targets).values_list(
+        'id', 'recipe_id', column,
+    )
+    for row_id, recipe_id, target_id in rows:
+        if target_id in targets[recipe_id]:
+            current.add((recipe_id, target_id))
+        else:
+            stale.append(row_id)
+
+    if stale:
+        through.objects.filter(id__in=stale).delete()
+    through.objects.bulk_create(
+        [
+            through(recipe_id=recipe_id, **{column: target_id})
+            for recipe_id, target_ids in targets.items()
+            for target_id in target_ids
+            if (recipe_id, target_id) not in current
+        ],
+        batch_size=BULK_BATCH_SIZE,
+    )
+
+
+class DynamicFieldsMixin:
+    """Chỉ giữ lại các field được truyền qua tham số `fields`."""
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+
+        if fields is not None:
+            for field_name in set(self.fields) - set(fields):
+                self.fields.pop(field_name)
+
+
+class UniqueNameMixin:
+    """Chuẩn hóa tên và báo lỗi 400 khi đổi tên trùng với tên đã có."""
+
+    def validate_name(self, value):
+        value = normalize_name(value)
+        # Khi lồng trong recipe, tên trùng được dùng để tìm object có sẵn
+        if self.parent is not None:
+            return value
+        user = (
+            self.instance.user if self.instance
+            else self.context['request'].user
+        )
+        duplicates = self.Meta.model.objects.filter(user=user).annotate(
+            key=Lower('name'),
+        ).filter(key=Lower(Value(value)))
+        if self.instance is not None:
+            duplicates = duplicates.exclude(pk=self.instance.pk)
+        if duplicates.exists():
+            raise serializers.ValidationError("Tên này đã tồn tại.")
+        return value
+
+
+class IngredientSerializer(
+    DynamicFieldsMixin, UniqueNameMixin, serializers.ModelSerializer,
+):
     """Serializer cho nguyên liệu."""
 
     class Meta:
         model = Ingredient
-        fields = ['id', 'name']
-        read_only_fields = ['id']
+        fields = ['id', 'name', 'usage_count']
+        read_only_fields = ['id', 'usage_count']
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(
+    DynamicFieldsMixin, UniqueNameMixin, serializers.ModelSerializer,
+):
     """Serializer cho thẻ."""
 
     class Meta:
         model = Tag
-        fields = ['id', 'name']
-        read_only_fields = ['id']
+        fields = ['id', 'name', 'usage_count']
+        read_only_fields = ['id', 'usage_count']
+
+
+class MediaFileField(serializers.FileField):
+    """FileField trả về URL của endpoint media có kiểm tra quyền."""
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        return media_url(value.name, self.context.get('request'))
+
+
+@extend_schema_field(OpenApiTypes.OBJECT)
+class ImageVariantsField(serializers.Field):
+    """URL và kích thước các ảnh đã resize, kèm srcset theo từng định dạng.
+
+    Nhận giá trị `image_variants` của recipe, gồm các kích thước từ lớn
+    đến nhỏ.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def _url(self, name):
+        return media_url(name, self.context.get('request'))
+
+    def to_representation(self, value):
+        sizes = {}
+        srcset = {}
+        # srcset đi từ nhỏ đến lớn, bỏ các kích thước dùng chung file
+        for variant in reversed(value):
+            size = {'width': variant['width'], 'height': variant['height']}
+            for key, name in variant.items():
+                if key in ('name', 'width', 'height'):
+                    continue
+                size[key] = self._url(name)
+                urls = srcset.setdefault(key, [])
+                if not urls or urls[-1][1] != variant['width']:
+                    urls.append((size[key], variant['width']))
+            sizes[variant['name']] = size
+        return {
+            'sizes': sizes,
+            'srcset': {
+                key: ', '.join(f'{url} {width}w' for url, width in urls)
+                for key, urls in srcset.items()
+            },
+        }
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """Serializer cho công thức nấu ăn"""
-    tags = TagSerializer(many=True, required=False)
-    ingredients = IngredientSerializer(many=True, required=False)
+    # usage_count thay đổi theo các recipe khác nên không nằm trong recipe
+    tags = TagSerializer(many=True, required=False, fields=['id', 'name'])
+    ingredients = IngredientSerializer(
+        many=True, required=False, fields=['id', 'name'],
+    )
+    images = ImageVariantsField(source='image_variants')
 
     class Meta:
         model = Recipe
         fields = [
-            'id', 'title', 'time_minutes', 'price', 'link', 'tags', 'ingredients'
+            'id', 'title', 'time_minutes', 'price', 'link', 'tags',
+            'ingredients', 'images',
         ]
         read_only_fields = ['id']
 
@@ -57,46 +255,57 @@ class RecipeSerializer(serializers.ModelSerializer):
 
     # ===== VALIDATE TỔNG THỂ (TÙY CHỌN) =====
     def validate(self, attrs):
+        # PATCH không bắt buộc gửi lại title
+        if self.partial and 'title' not in attrs:
+            return attrs
         if not attrs.get('title'):
             raise serializers.ValidationError("Vui lòng nhập tên công thức.")
         return attrs
 
     # ===== XỬ LÝ TAG / INGREDIENT =====
-    def _get_or_create_tags(self, tags, recipe):
+    def _get_or_create_tags(self, tags):
         auth_user = self.context['request'].user
-        for tag in tags:
-            tag_obj, created = Tag.objects.get_or_create(user=auth_user, **tag)
-            recipe.tags.add(tag_obj)
+        tag_objs = resolve_names(Tag, auth_user, (tag['name'] for tag in tags))
+        return list(tag_objs.values())
 
-    def _get_or_create_ingredients(self, ingredients, recipe):
+    def _get_or_create_ingredients(self, ingredients):
         auth_user = self.context['request'].user
-        for ingredient in ingredients:
-            ingredient_obj, create = Ingredient.objects.get_or_create(user=auth_user, **ingredient)
-            recipe.ingredients.add(ingredient_obj)
+        ingredient_objs = resolve_names(
+            Ingredient, auth_user,
+            (ingredient['name'] for ingredient in ingredients),
+        )
+        return list(ingredient_objs.values())
 
     def create(self, validated_data):
         tags = validated_data.pop('tags', [])
         ingredients = validated_data.pop('ingredients', [])
         recipe = Recipe.objects.create(**validated_data)
-        self._get_or_create_tags(tags, recipe)
-        self._get_or_create_ingredients(ingredients, recipe)
+        recipe.tags.add(*self._get_or_create_tags(tags))
+        recipe.ingredients.add(*self._get_or_create_ingredients(ingredients))
         return recipe
 
     def update(self, instance, validated_data):
         tags = validated_data.pop('tags', None)
         ingredients = validated_data.pop('ingredients', None)
 
+        # set() chỉ xóa/thêm các dòng thay đổi thay vì clear() rồi thêm lại
         if tags is not None:
-            instance.tags.clear()
-            self._get_or_create_tags(tags, instance)
+            instance.tags.set(self._get_or_create_tags(tags))
         if ingredients is not None:
-            instance.ingredients.clear()
-            self._get_or_create_ingredients(ingredients, instance)
+            instance.ingredients.set(
+                self._get_or_create_ingredients(ingredients)
+            )
 
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
+        # Chỉ ghi các cột thực sự thay đổi, bỏ qua save nếu không có gì đổi
+        changed = [
+            attr for attr, value in validated_data.items()
+            if getattr(instance, attr) != value
+        ]
+        for attr in changed:
+            setattr(instance, attr, validated_data[attr])
 
-        instance.save()
+        if changed:
+            instance.save(update_fields=changed + ['updated_at'])
         return instance
 
 
@@ -104,14 +313,192 @@ class RecipeDetailSerializer(RecipeSerializer):
     """Serializer cho chi tiết công thức."""
 
     class Meta(RecipeSerializer.Meta):
-        fields = RecipeSerializer.Meta.fields + ['description']
+        fields = RecipeSerializer.Meta.fields + ['description', 'image_status']
+
+
+class RecipeExportSerializer(RecipeDetailSerializer):
+    """Serializer cho một công thức trong file export, kèm email chủ sở hữu."""
+    user = serializers.EmailField(source='user.email', read_only=True)
+
+    class Meta(RecipeDetailSerializer.Meta):
+        fields = ['user'] + RecipeDetailSerializer.Meta.fields
 
 
 class RecipeImageSerializer(serializers.ModelSerializer):
-    """Serializer cho ảnh công thức."""
+    """Serializer cho ảnh công thức.
+
+    File gửi lên chỉ được lưu nguyên bản vào `image_upload` và đưa vào hàng
+    đợi, lệnh process_images giải mã và resize thành `image` sau. Khi đọc,
+    `image` là ảnh đã xử lý gần nhất.
+    """
+    # FileField không mở file bằng Pillow như ImageField
+    image = MediaFileField()
+    images = ImageVariantsField(source='image_variants')
 
     class Meta:
         model = Recipe
-        fields = ['id', 'image']
-        read_only_fields = ['id']
-        extra_kwargs = {'image': {'required': True}}
+        fields = ['id', 'image', 'image_status', 'images']
+        read_only_fields = ['id', 'image_status']
+
+    def validate_image(self, value):
+        """Chỉ đọc header để kiểm tra định dạng, ảnh được giải mã sau."""
+        try:
+            with Image.open(value) as image:
+                image_format = image.format
+        except DECODE_ERRORS:
+            raise serializers.ValidationError(
+                'File tải lên không phải là ảnh hợp lệ.'
+            )
+        if image_format not in UPLOAD_FORMATS:
+            raise serializers.ValidationError(
+                f'Định dạng ảnh {image_format} không được hỗ trợ.'
+            )
+        value.seek(0)
+        return value
+
+    def update(self, instance, validated_data):
+        """Lưu file gốc và đánh dấu ảnh chờ xử lý.
+
+        File có cùng nội dung với một ảnh đã xử lý thì dùng lại blob của ảnh
+        đó ngay, không cần chờ worker.
+        """
+        previous = instance.image_upload.name
+        storage = instance.image_upload.storage
+        upload = validated_data['image']
+        sha256 = getattr(upload, 'sha256', None)
+        with transaction.atomic():
+            blob = None
+            if sha256 is not None:
+                blob = locked_blob(sha256.hexdigest())
+            # File gốc cũ chưa kịp xử lý không còn cần nữa
+            obsolete = {previous}
+            if blob is not None:
+                if instance.image_blob_id is None:
+                    # Ảnh từ trước khi có blob không dùng chung với recipe
+                    # khác, giống process_image
+                    obsolete |= variant_files(instance.image_variants)
+                    obsolete.add(instance.image.name)
+                # File upload không được giữ lại sau request
+                fields = {**blob_fields(blob), 'image_upload': None}
+            elif hasattr(upload, 'storage_name'):
+                # File đã được RecipeImageUploadHandler ghi vào đúng chỗ
+                upload.keep()
+                fields = {
+                    'image_upload': upload.storage_name,
+                    'image_status': ImageStatus.PENDING,
+                }
+            else:
+                fields = {
+                    'image_upload': upload,
+                    'image_status': ImageStatus.PENDING,
+                }
+            for name, value in fields.items():
+                setattr(instance, name, value)
+            instance.image_status_at = timezone.now()
+            instance.save(update_fields=[
+                *fields, 'image_status_at', 'updated_at',
+            ])
+        # Không xóa các file recipe vẫn đang hiển thị
+        obsolete -= variant_files(instance.image_variants)
+        obsolete -= {instance.image.name, '', None}
+
+        def delete_obsolete():
+            for name in obsolete:
+                storage.delete(name)
+
+        transaction.on_commit(delete_obsolete)
+        return instance
+
+
+class BulkDeleteSerializer(serializers.Serializer):
+    """Serializer cho yêu cầu xóa hàng loạt."""
+    ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        required=False,
+        max_length=1000,
+        write_only=True,
+    )
+    deleted = serializers.IntegerField(read_only=True)
+
+
+class RecipeBulkListSerializer(serializers.ListSerializer):
+    """Tạo hoặc cập nhật nhiều công thức bằng các câu lệnh hàng loạt."""
+    max_items = 1000
+
+    def validate(self, attrs):
+        if len(attrs) > self.max_items:
+            raise serializers.ValidationError(
+                f"Chỉ được gửi tối đa {self.max_items} công thức mỗi lần."
+            )
+
+        ids = [item['id'] for item in attrs if 'id' in item]
+        if len(ids) != len(set(ids)):
+            raise serializers.ValidationError(
+                "Mỗi công thức chỉ được cập nhật một lần."
+            )
+        self.existing = Recipe.objects.filter(
+            user=self.context['request'].user,
+            id__in=ids,
+        ).in_bulk()
+        missing = sorted(set(ids) - set(self.existing))
+        if missing:
+            raise serializers.ValidationError(
+                f"Không tìm thấy công thức: {missing}."
+            )
+        return attrs
+
+    def save(self, **kwargs):
+        """Ghi toàn bộ công thức, trả về danh sách theo thứ tự gửi lên."""
+        user = kwargs['user']
+        items = [dict(item) for item in self.validated_data]
+        tags = resolve_names(Tag, user, (
+            tag['name'] for item in items for tag in item.get('tags', [])
+        ))
+        ingredients = resolve_names(Ingredient, user, (
+            ingredient['name']
+            for item in items
+            for ingredient in item.get('ingredients', [])
+        ))
+
+        now = timezone.now()
+        recipes, to_create, to_update = [], [], []
+        update_fields = {'updated_at'}
+        for item in items:
+            item.pop('tags', None)
+            item.pop('ingredients', None)
+            recipe_id = item.pop('id', None)
+            if recipe_id is None:
+                recipe = Recipe(user=user, **item)
+                to_create.append(recipe)
+            else:
+                recipe = self.existing[recipe_id]
+                for attr, value in item.items():
+                    setattr(recipe, attr, value)
+                recipe.updated_at = now
+                update_fields.update(item)
+                to_update.append(recipe)
+            recipes.append(recipe)
+
+        Recipe.objects.bulk_create(to_create, batch_size=BULK_BATCH_SIZE)
+        Recipe.objects.bulk_update(
+            to_update, update_fields, batch_size=BULK_BATCH_SIZE,
+        )
+
+        # Chỉ gán lại quan hệ của những công thức có gửi tags/ingredients
+        for field, objects in (('tags', tags), ('ingredients', ingredients)):
+            set_related(field, {
+                recipe.id: {objects[value['name']].id for value in item[field]}
+                for recipe, item in zip(recipes, self.validated_data)
+                if field in item
+            })
+
+        self.instance = recipes
+        return recipes
+
+
+class RecipeBulkSerializer(RecipeDetailSerializer):
+    """Serializer cho một công thức trong yêu cầu ghi hàng loạt."""
+    id = serializers.IntegerField(required=False)
+
+    class Meta(RecipeDetailSerializer.Meta):
+        list_serializer_class = RecipeBulkListSerializer
@@ -0,0 +1,88 @@
+"""
+Signal handlers for the recipe APIs.
+"""
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core.models import (
+    Recipe,
+    Tag,
+    Ingredient,
+)
+from recipe.cache import bump_cache_version
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_user_cache(sender, instance, **kwargs):
+    """Invalidate the cached responses of the owner."""
+    bump_cache_version(instance.user_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def invalidate_user_cache_on_m2m(sender, instance, action, **kwargs):
+    """Invalidate the cached responses when tags/ingredients change."""
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_cache_version(instance.user_id)
+
+
+def touch_recipes(recipe_ids):
+    """Mark recipes as modified without running their save signals."""
+    Recipe.objects.filter(id__in=recipe_ids).update(
+        updated_at=timezone.now(),
+    )
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def touch_recipes_on_m2m(sender, instance, action, reverse, pk_set, **kwargs):
+    """Update `updated_at` of recipes whose tags/ingredients changed."""
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            touch_recipes([instance.pk])
+        return
+
+    # Thay đổi từ phía tag/ingredient: pk_set là id của các recipe
+    if action == 'pre_clear':
+        instance._cleared_recipe_ids = list(
+            instance.recipe_set.values_list('id', flat=True)
+        )
+    elif action == 'post_clear':
+        touch_recipes(instance._cleared_recipe_ids)
+    elif action in ('post_add', 'post_remove'):
+        touch_recipes(pk_set)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def touch_recipes_on_rename(sender, instance, created, **kwargs):
+    """Update `updated_at` of recipes showing a changed tag/ingredient."""
+    if not created:
+        touch_recipes(instance.recipe_set.values('id'))
+
+
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def collect_recipes_on_delete(sender, instance, **kwargs):
+    """Remember the recipes that lose a tag/ingredient being deleted."""
+    instance._deleted_recipe_ids = list(
+        instance.recipe_set.values_list('id', flat=True)
+    )
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def touch_recipes_on_delete(sender, instance, **kwargs):
+    """Update `updated_at` of recipes that lost a tag/ingredient."""
+    touch_recipes(getattr(instance, '_deleted_recipe_ids', []))
@@ -0,0 +1,132 @@
+"""
+Tests for the recipe API response cache.
+"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import (
+    Recipe,
+    Tag,
+)
+from recipe.cache import get_cache_version
+
+
+RECIPES_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+
+
+def detail_url(recipe_id):
+    """Create and return a recipe detail URL."""
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+def create_recipe(user, **params):
+    """Create and return a sample recipe."""
+    defaults = {
+        'title': 'Sample recipe title',
+        'time_minutes': 22,
+        'price': Decimal('5.25'),
+    }
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class ResponseCacheTests(TestCase):
+    """Test caching of the recipe API responses."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'test123',
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_list_served_from_cache(self):
+        """Test a repeated list request only runs the ETag query."""
+        create_recipe(user=self.user)
+        res1 = self.client.get(RECIPES_URL)
+
+        with self.assertNumQueries(1):
+            res2 = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res2.status_code, status.HTTP_200_OK)
+        self.assertEqual(res1.data, res2.data)
+
+    def test_detail_served_from_cache(self):
+        """Test a repeated detail request only runs the ETag query."""
+        recipe = create_recipe(user=self.user)
+        self.client.get(detail_url(recipe.id))
+
+        with self.assertNumQueries(1):
+            res = self.client.get(detail_url(recipe.id))
+
+        self.assertEqual(res.data['id'], recipe.id)
+
+    def test_write_invalidates_cache(self):
+        """Test updating a recipe invalidates the cached responses."""
+        recipe = create_recipe(user=self.user)
+        self.client.get(RECIPES_URL)
+        self.client.get(detail_url(recipe.id))
+
+        self.client.patch(detail_url(recipe.id), {'title': 'New title'})
+
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(res.data['results'][0]['title'], 'New title')
+        res = self.client.get(detail_url(recipe.id))
+        self.assertEqual(res.data['title'], 'New title')
+
+    def test_m2m_change_invalidates_cache(self):
+        """Test assigning a tag invalidates the cached responses."""
+        recipe = create_recipe(user=self.user)
+        self.client.get(RECIPES_URL)
+        self.client.get(TAGS_URL)
+
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe.tags.add(tag)
+
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(res.data['results'][0]['tags'][0]['id'], tag.id)
+        res = self.client.get(TAGS_URL)
+        self.assertEqual(res.data['results'][0]['id'], tag.id)
+
+    def test_delete_invalidates_cache(self):
+        """Test deleting a recipe invalidates the cached responses."""
+        recipe = create_recipe(user=self.user)
+        self.client.get(RECIPES_URL)
+
+        recipe.delete()
+
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(res.data['results'], [])
+
+    def test_cache_version_per_user(self):
+        """Test writes only invalidate the owner's cache."""
+        other_user = get_user_model().objects.create_user(
+            'other@example.com',
+            'test123',
+        )
+        version = get_cache_version(self.user.id)
+
+        create_recipe(user=other_user)
+
+        self.assertEqual(get_cache_version(self.user.id), version)
+        create_recipe(user=self.user)
+        self.assertNotEqual(get_cache_version(self.user.id), version)
+
+    def test_version_bumped_after_commit(self):
+        """Test the version is bumped again when the write commits."""
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            create_recipe(user=self.user)
+            version = get_cache_version(self.user.id)
+
+        self.assertEqual(len(callbacks), 1)
+        self.assertNotEqual(get_cache_version(self.user.id), version)
@@ -0,0 +1,139 @@
+"""
+Tests for conditional GETs on the recipe API.
+"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import (
+    Recipe,
+    Tag,
+)
+
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+def detail_url(recipe_id):
+    """Create and return a recipe detail URL."""
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+def create_recipe(user, **params):
+    """Create and return a sample recipe."""
+    defaults = {
+        'title': 'Sample recipe title',
+        'time_minutes': 22,
+        'price': Decimal('5.25'),
+    }
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class ConditionalGetTests(TestCase):
+    """Test ETag and Last-Modified handling of the recipe API."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'test123',
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_detail_not_modified(self):
+        """Test a matching If-None-Match returns 304 from one query."""
+        recipe = create_recipe(user=self.user)
+        res = self.client.get(detail_url(recipe.id))
+        etag = res['ETag']
+
+        with self.assertNumQueries(1):
+            res = self.client.get(
+                detail_url(recipe.id), HTTP_IF_NONE_MATCH=etag,
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res['ETag'], etag)
+        self.assertEqual(res.content, b'')
+
+    def test_detail_if_modified_since(self):
+        """Test If-Modified-Since returns 304 for an unchanged recipe."""
+        recipe = create_recipe(user=self.user)
+        res = self.client.get(detail_url(recipe.id))
+
+        res = self.client.get(
+            detail_url(recipe.id),
+            HTTP_IF_MODIFIED_SINCE=res['Last-Modified'],
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_detail_modified(self):
+        """Test an update changes the recipe ETag."""
+        recipe = create_recipe(user=self.user)
+        etag = self.client.get(detail_url(recipe.id))['ETag']
+
+        self.client.patch(detail_url(recipe.id), {'title': 'New title'})
+        res = self.client.get(detail_url(recipe.id), HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+        self.assertEqual(res.data['title'], 'New title')
+
+    def test_detail_modified_by_tag_change(self):
+        """Test tag changes modify the ETag of the recipes using them."""
+        recipe = create_recipe(user=self.user)
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe.tags.add(tag)
+        etags = [self.client.get(detail_url(recipe.id))['ETag']]
+
+        tag.name = 'Vegetarian'
+        tag.save()
+        etags.append(self.client.get(detail_url(recipe.id))['ETag'])
+        tag.delete()
+        etags.append(self.client.get(detail_url(recipe.id))['ETag'])
+
+        self.assertEqual(len(set(etags)), 3)
+
+    def test_detail_not_found(self):
+        """Test conditional headers do not hide a missing recipe."""
+        res = self.client.get(detail_url(0), HTTP_IF_NONE_MATCH='"abc"')
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_list_not_modified(self):
+        """Test a matching If-None-Match on the list returns 304."""
+        create_recipe(user=self.user)
+        res = self.client.get(RECIPES_URL)
+        etag = res['ETag']
+
+        with self.assertNumQueries(1):
+            res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_list_modified_by_delete(self):
+        """Test deleting a recipe changes the list ETag."""
+        create_recipe(user=self.user)
+        recipe = create_recipe(user=self.user)
+        etag = self.client.get(RECIPES_URL)['ETag']
+
+        recipe.delete()
+        res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['results']), 1)
+
+    def test_list_etag_depends_on_query(self):
+        """Test different pages and filters have different ETags."""
+        create_recipe(user=self.user)
+
+        res1 = self.client.get(RECIPES_URL)
+        res2 = self.client.get(RECIPES_URL, {'page_size': 1})
+
+        self.assertNotEqual(res1['ETag'], res2['ETag'])
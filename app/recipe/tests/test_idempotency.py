@@ -0,0 +1,133 @@
+"""
+Tests for Idempotency-Key handling on the recipe API.
+"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import (
+    IdempotencyKey,
+    Recipe,
+)
+
+
+RECIPES_URL = reverse('recipe:recipe-list')
+PAYLOAD = {
+    'title': 'Sample recipe',
+    'time_minutes': 30,
+    'price': Decimal('5.99'),
+    'tags': [{'name': 'Dinner'}],
+}
+
+
+def detail_url(recipe_id):
+    """Create and return a recipe detail URL."""
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+class IdempotencyKeyTests(TestCase):
+    """Test repeated writes with the same Idempotency-Key."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.client.force_authenticate(self.user)
+
+    def _post(self, payload, key='key-1'):
+        return self.client.post(
+            RECIPES_URL, payload, format='json', HTTP_IDEMPOTENCY_KEY=key,
+        )
+
+    def test_repeated_create_replays_response(self):
+        """Test a retried create returns the first response."""
+        res1 = self._post(PAYLOAD)
+        res2 = self._post(PAYLOAD)
+
+        self.assertEqual(res1.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res2.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res2.data, res1.data)
+        self.assertEqual(res2['Idempotent-Replayed'], 'true')
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 1)
+
+    def test_create_without_key(self):
+        """Test writes without a key are not deduplicated."""
+        self.client.post(RECIPES_URL, PAYLOAD, format='json')
+        self.client.post(RECIPES_URL, PAYLOAD, format='json')
+
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 2)
+
+    def test_key_reused_for_other_request(self):
+        """Test reusing a key with a different payload is rejected."""
+        self._post(PAYLOAD)
+
+        res = self._post({**PAYLOAD, 'title': 'Other recipe'})
+
+        self.assertEqual(res.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 1)
+
+    def test_failed_request_not_stored(self):
+        """Test a request that failed can be retried with the same key."""
+        res = self._post({**PAYLOAD, 'time_minutes': 0})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self._post(PAYLOAD)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertNotIn('Idempotent-Replayed', res)
+
+    def test_keys_are_per_user(self):
+        """Test the same key of another user does not replay."""
+        self._post(PAYLOAD)
+        other = get_user_model().objects.create_user(
+            'other@example.com',
+            'testpass123',
+        )
+        self.client.force_authenticate(other)
+
+        res = self._post(PAYLOAD)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Recipe.objects.filter(user=other).count(), 1)
+
+    @override_settings(IDEMPOTENCY_KEY_TTL=0)
+    def test_expired_key_runs_again(self):
+        """Test a key older than its TTL no longer replays."""
+        self._post(PAYLOAD)
+        self._post(PAYLOAD)
+
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(IdempotencyKey.objects.count(), 1)
+
+    def test_repeated_partial_update(self):
+        """Test a retried PATCH replays instead of writing again."""
+        recipe_id = self._post(PAYLOAD).data['id']
+        url = detail_url(recipe_id)
+
+        res1 = self.client.patch(
+            url, {'title': 'New title'}, HTTP_IDEMPOTENCY_KEY='key-2',
+        )
+        Recipe.objects.filter(id=recipe_id).update(title='Changed later')
+        res2 = self.client.patch(
+            url, {'title': 'New title'}, HTTP_IDEMPOTENCY_KEY='key-2',
+        )
+
+        self.assertEqual(res1.status_code, status.HTTP_200_OK)
+        self.assertEqual(res2.data, res1.data)
+        self.assertEqual(
+            Recipe.objects.get(id=recipe_id).title, 'Changed later',
+        )
+
+    def test_key_too_long(self):
+        """Test keys longer than 255 characters are rejected."""
+        res = self._post(PAYLOAD, key='k' * 256)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Recipe.objects.exists())
@@ -10,7 +10,7 @@ from django.test import TestCase
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from core.models import Ingredient
+from core.models import Ingredient, Recipe
 
 from recipe.serializers import IngredientSerializer
 
@@ -56,7 +56,7 @@ class PrivateIngredientApiTests(TestCase):
 
         serializer = IngredientSerializer(ingredients, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_ingredients_limited_to_user(self):
         """Test list of ingredients is limited to authenticated user."""
@@ -67,9 +67,58 @@ class PrivateIngredientApiTests(TestCase):
         res = self.client.get(INGREDIENT_URL)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data[0]['name'], ingredient.name)
-        self.assertEqual(res.data[0]['id'], ingredient.id)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['results'][0]['name'], ingredient.name)
+        self.assertEqual(res.data['results'][0]['id'], ingredient.id)
+
+    def test_ingredients_ordered_by_usage(self):
+        """Test ingredient usage counts after bulk recipe writes."""
+        bulk_url = reverse('recipe:recipe-bulk')
+        payload = [
+            {
+                'title': f'Recipe {i}',
+                'time_minutes': 5,
+                'price': '1.00',
+                'ingredients': [{'name': 'Salt'}] + (
+                    [{'name': 'Pepper'}] if i else []
+                ),
+            }
+            for i in range(3)
+        ]
+        res = self.client.post(bulk_url, payload, format='json')
+        recipe_id = res.data[2]['id']
+        self.client.post(
+            reverse('recipe:recipe-bulk-delete'),
+            {'ids': [recipe_id]},
+            format='json',
+        )
+
+        res = self.client.get(INGREDIENT_URL, {'ordering': 'usage'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        counts = [
+            (i['name'], i['usage_count']) for i in res.data['results']
+        ]
+        self.assertEqual(counts, [('Pepper', 1), ('Salt', 2)])
+        self.assertEqual(Recipe.objects.count(), 2)
+
+    def test_filter_ingredients_assigned_to_recipes(self):
+        """Test listing ingredients by those assigned to recipes."""
+        in1 = Ingredient.objects.create(user=self.user, name='Apples')
+        in2 = Ingredient.objects.create(user=self.user, name='Turkey')
+        recipe = Recipe.objects.create(
+            user=self.user, title='Apple Crumble',
+            time_minutes=5, price='4.50',
+        )
+        recipe.ingredients.add(in1)
+        in1.refresh_from_db()
+
+        res = self.client.get(INGREDIENT_URL, {'assigned_only': 1})
+
+        s1 = IngredientSerializer(in1)
+        s2 = IngredientSerializer(in2)
+        self.assertIn(s1.data, res.data['results'])
+        self.assertNotIn(s2.data, res.data['results'])
 
     def test_update_ingredient(self):
         """Test updating an ingredient."""
@@ -0,0 +1,101 @@
+"""
+Tests for the recipe media endpoint.
+"""
+import os
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import ImageBlob, ImageStatus, Recipe
+from recipe.images import blob_directory
+
+
+def media_url(name):
+    """Create and return the media URL of a stored file."""
+    return reverse('recipe:media', args=[name])
+
+
+class RecipeMediaTests(TestCase):
+    """Test serving recipe images to their owners."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.client.force_authenticate(self.user)
+        self.storage = Recipe._meta.get_field('image').storage
+        sha256 = 'a' * 64
+        self.name = self.storage.save(
+            os.path.join(blob_directory(sha256), 'full.jpg'),
+            ContentFile(b'jpeg data'),
+        )
+        variants = [{
+            'name': 'full', 'width': 10, 'height': 10, 'jpeg': self.name,
+        }]
+        blob = ImageBlob.objects.create(
+            sha256=sha256, variants=variants, metadata={},
+        )
+        self.recipe = Recipe.objects.create(
+            user=self.user, title='Soup', time_minutes=10,
+            price=Decimal('1.00'), image=self.name, image_blob=blob,
+            image_variants=variants, image_status=ImageStatus.READY,
+        )
+
+    def tearDown(self):
+        self.storage.delete(self.name)
+
+    def test_owner_gets_file(self):
+        """Test the owner of a recipe can download its image."""
+        res = self.client.get(media_url(self.name))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(res.streaming_content), b'jpeg data')
+        self.assertEqual(res['Content-Type'], 'image/jpeg')
+        self.assertIn('private', res['Cache-Control'])
+
+    def test_other_user_gets_404(self):
+        """Test images of recipes of other users are not served."""
+        other = get_user_model().objects.create_user(
+            'other@example.com',
+            'testpass123',
+        )
+        self.client.force_authenticate(other)
+
+        res = self.client.get(media_url(self.name))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_auth_required(self):
+        """Test media is not served to anonymous users."""
+        res = APIClient().get(media_url(self.name))
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(MEDIA_ACCEL_REDIRECT_PREFIX='/protected-media/')
+    def test_accel_redirect(self):
+        """Test the transfer is handed to nginx when configured."""
+        res = self.client.get(media_url(self.name), HTTP_ACCEPT='image/webp')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            res['X-Accel-Redirect'], f'/protected-media/{self.name}',
+        )
+        self.assertEqual(res['Content-Type'], 'image/jpeg')
+        self.assertEqual(res.content, b'')
+
+    def test_recipe_links_to_media_endpoint(self):
+        """Test image URLs in recipe responses use the media endpoint."""
+        res = self.client.get(
+            reverse('recipe:recipe-detail', args=[self.recipe.id]),
+        )
+
+        url = res.data['images']['sizes']['full']['jpeg']
+        self.assertEqual(url, f'http://testserver{media_url(self.name)}')
@@ -3,25 +3,40 @@ Tests for recipe API
 """
 
 from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest.mock import patch
+import json
 import tempfile
 import os
 
 from PIL import Image
 
 from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Prefetch
 from django.test import TestCase  # Class dùng để test trong django
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse  # class dùng để lấy url từ tên route trong urls.py
 
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 # giả lập request HTTP như get post push
 from rest_framework.test import APIClient
 
 from core.models import (
+    ImageStatus,
     Recipe,
     Tag,
     Ingredient,
+    recipe_upload_file_path,
 )
 
+from recipe.images import IMAGE_FORMATS, variant_files
+from recipe.projections import SerializerProjection
+from recipe.uploads import StoredUploadedFile
 from recipe.serializers import (
     RecipeSerializer,
     RecipeDetailSerializer,
@@ -30,6 +45,9 @@ from recipe.serializers import (
 
 # Tự động lấy url /api/recipe/recipes
 RECIPES_URL = reverse('recipe:recipe-list')
+EXPORT_URL = reverse('recipe:recipe-export')
+BULK_URL = reverse('recipe:recipe-bulk')
+BULK_DELETE_URL = reverse('recipe:recipe-bulk-delete')
 
 
 def detail_url(recipe_id):
@@ -105,7 +123,7 @@ class PrivateRecipeApiTest(TestCase):
 
         # So sánh dữ liệu của Api trả về với dữ liệu thật trong serializer
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     # Mỗi user chỉ được nhìn thấy recipe của chính mình
     def test_recipe_list_limited_to_user(self):
@@ -124,7 +142,7 @@ class PrivateRecipeApiTest(TestCase):
         serializer = RecipeSerializer(recipes, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_get_recipe_detail(self):
         """Test get recipe details"""
@@ -208,6 +226,40 @@ class PrivateRecipeApiTest(TestCase):
         self.assertEqual(recipe.user, self.user)
 
     # Không cho thay đổi user recipe bằng một user khác bằng api
+    def test_partial_update_writes_changed_columns(self):
+        """Test a PATCH only writes the columns it changes."""
+        recipe = create_recipe(user=self.user, description='Long text')
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.patch(detail_url(recipe.id), {'price': '9.99'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        updates = [
+            q['sql'] for q in queries
+            if q['sql'].startswith('UPDATE "core_recipe"')
+        ]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('"price"', updates[0])
+        self.assertNotIn('"description"', updates[0])
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.price, Decimal('9.99'))
+
+    def test_partial_update_unchanged_skips_save(self):
+        """Test a PATCH with the current values does not write the row."""
+        recipe = create_recipe(user=self.user)
+        payload = {'title': recipe.title, 'price': str(recipe.price)}
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.patch(detail_url(recipe.id), payload)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertFalse(any(
+            q['sql'].startswith('UPDATE "core_recipe"') for q in queries
+        ))
+        updated_at = recipe.updated_at
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.updated_at, updated_at)
+
     def test_update_user_returns_error(self):
         """Test changing the recipe user results in an error."""
         new_user = create_user(email='user2@example.com', password='test123')
@@ -245,6 +297,248 @@ class PrivateRecipeApiTest(TestCase):
         self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
         self.assertTrue(Recipe.objects.filter(id=recipe.id).exists())
 
+    def test_recipes_paginated_with_cursor(self):
+        """Test the recipe list is paginated with an opaque cursor."""
+        r1 = create_recipe(user=self.user, title='Recipe one')
+        r2 = create_recipe(user=self.user, title='Recipe two')
+        r3 = create_recipe(user=self.user, title='Recipe three')
+
+        res = self.client.get(RECIPES_URL, {'page_size': 2})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn('count', res.data)
+        self.assertEqual(
+            [r['id'] for r in res.data['results']], [r3.id, r2.id]
+        )
+        self.assertIsNotNone(res.data['next'])
+
+        res = self.client.get(res.data['next'])
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([r['id'] for r in res.data['results']], [r1.id])
+        self.assertIsNone(res.data['next'])
+
+    def test_filter_by_tags(self):
+        """Test filtering recipes that have any of the given tags."""
+        r1 = create_recipe(user=self.user, title='Thai Vegetable Curry')
+        r2 = create_recipe(user=self.user, title='Aubergine with Tahini')
+        r3 = create_recipe(user=self.user, title='Fish and chips')
+        tag1 = Tag.objects.create(user=self.user, name='Vegan')
+        tag2 = Tag.objects.create(user=self.user, name='Vegetarian')
+        r1.tags.add(tag1)
+        r2.tags.add(tag1, tag2)
+
+        params = {'tags': f'{tag1.id},{tag2.id}'}
+        res = self.client.get(RECIPES_URL, params)
+
+        ids = [r['id'] for r in res.data['results']]
+        self.assertEqual(ids, [r2.id, r1.id])
+        self.assertNotIn(r3.id, ids)
+
+    def test_filter_by_all_tags(self):
+        """Test filtering recipes that have all of the given tags."""
+        r1 = create_recipe(user=self.user, title='Thai Vegetable Curry')
+        r2 = create_recipe(user=self.user, title='Aubergine with Tahini')
+        tag1 = Tag.objects.create(user=self.user, name='Vegan')
+        tag2 = Tag.objects.create(user=self.user, name='Vegetarian')
+        r1.tags.add(tag1)
+        r2.tags.add(tag1, tag2)
+
+        params = {'tags': f'{tag1.id},{tag2.id}', 'match': 'all'}
+        res = self.client.get(RECIPES_URL, params)
+
+        self.assertEqual([r['id'] for r in res.data['results']], [r2.id])
+
+    def test_filter_by_ingredients(self):
+        """Test filtering recipes by ingredients."""
+        r1 = create_recipe(user=self.user, title='Posh Beans on Toast')
+        r2 = create_recipe(user=self.user, title='Chicken Cacciatore')
+        r3 = create_recipe(user=self.user, title='Red Lentil Daal')
+        in1 = Ingredient.objects.create(user=self.user, name='Feta Cheese')
+        in2 = Ingredient.objects.create(user=self.user, name='Chicken')
+        r1.ingredients.add(in1)
+        r2.ingredients.add(in2)
+
+        params = {'ingredients': f'{in1.id},{in2.id}'}
+        res = self.client.get(RECIPES_URL, params)
+
+        ids = [r['id'] for r in res.data['results']]
+        self.assertEqual(ids, [r2.id, r1.id])
+        self.assertNotIn(r3.id, ids)
+
+    def test_filter_by_tags_and_ingredients(self):
+        """Test tag and ingredient filters are combined."""
+        r1 = create_recipe(user=self.user, title='Vegan Curry')
+        r2 = create_recipe(user=self.user, title='Vegan Salad')
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        ingredient = Ingredient.objects.create(user=self.user, name='Rice')
+        r1.tags.add(tag)
+        r1.ingredients.add(ingredient)
+        r2.tags.add(tag)
+
+        params = {'tags': f'{tag.id}', 'ingredients': f'{ingredient.id}'}
+        res = self.client.get(RECIPES_URL, params)
+
+        self.assertEqual([r['id'] for r in res.data['results']], [r1.id])
+
+    def test_filter_invalid_params(self):
+        """Test invalid filter params return an error."""
+        res = self.client.get(RECIPES_URL, {'tags': '1,abc'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.client.get(RECIPES_URL, {'tags': '1', 'match': 'some'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_filter_params_ignored_outside_list(self):
+        """Test list filter params do not affect detail actions."""
+        recipe = create_recipe(user=self.user)
+        url = f'{detail_url(recipe.id)}?tags=x&search=nothing'
+
+        res = self.client.patch(url, {'title': 'New title'})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        res = self.client.get(url)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_search_recipes(self):
+        """Test searching recipes by title and description."""
+        r1 = create_recipe(
+            user=self.user,
+            title='Chicken curry',
+            description='Spicy dinner',
+        )
+        r2 = create_recipe(
+            user=self.user,
+            title='Green salad',
+            description='Goes well with chicken',
+        )
+        create_recipe(user=self.user, title='Apple pie', description='Sweet')
+        other_user = create_user(email='other@example.com', password='test123')
+        create_recipe(user=other_user, title='Chicken soup')
+
+        res = self.client.get(RECIPES_URL, {'search': 'chicken'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        # Khớp ở title được xếp hạng cao hơn khớp ở description
+        ids = [r['id'] for r in res.data['results']]
+        self.assertEqual(ids, [r1.id, r2.id])
+
+    def test_search_paginates_by_rank(self):
+        """Test search results can be paged through with the cursor."""
+        expected = [
+            create_recipe(
+                user=self.user,
+                title='Chicken ' + 'chicken ' * i,
+                description='Chicken',
+            ).id
+            for i in range(5)
+        ]
+        expected.reverse()
+
+        res = self.client.get(
+            RECIPES_URL, {'search': 'chicken', 'page_size': 2},
+        )
+        ids = [r['id'] for r in res.data['results']]
+        while res.data['next']:
+            res = self.client.get(res.data['next'])
+            ids += [r['id'] for r in res.data['results']]
+
+        self.assertEqual(ids, expected)
+
+    def test_search_after_update(self):
+        """Test the search index follows recipe updates."""
+        recipe = create_recipe(user=self.user, title='Beef stew')
+
+        payload = {'title': 'Mushroom stew'}
+        self.client.patch(detail_url(recipe.id), payload)
+
+        res = self.client.get(RECIPES_URL, {'search': 'mushroom'})
+        self.assertEqual([r['id'] for r in res.data['results']], [recipe.id])
+        res = self.client.get(RECIPES_URL, {'search': 'beef'})
+        self.assertEqual(res.data['results'], [])
+
+    def test_list_output_matches_serializer(self):
+        """Test the list output is byte-identical to RecipeSerializer."""
+        tags = [
+            Tag.objects.create(user=self.user, name=name)
+            for name in ['Vegan', 'Dinner', 'Thai']
+        ]
+        ingredient = Ingredient.objects.create(user=self.user, name='Salt')
+        r1 = create_recipe(user=self.user, price=Decimal('10.50'), link='')
+        r1.tags.add(tags[2], tags[0])
+        r1.ingredients.add(ingredient)
+        r2 = create_recipe(user=self.user, title='Lemon tart')
+        r2.tags.add(*tags)
+
+        res = self.client.get(RECIPES_URL)
+
+        # Tags/ingredients lồng bên trong được sắp xếp theo id
+        recipes = Recipe.objects.filter(user=self.user).order_by(
+            '-id',
+        ).prefetch_related(
+            Prefetch('tags', queryset=Tag.objects.order_by('id')),
+            Prefetch(
+                'ingredients', queryset=Ingredient.objects.order_by('id'),
+            ),
+        )
+        serializer = RecipeSerializer(recipes, many=True)
+        renderer = JSONRenderer()
+        self.assertEqual(
+            renderer.render(res.data['results']),
+            renderer.render(serializer.data),
+        )
+
+    def test_list_sparse_fields(self):
+        """Test only the requested fields are returned in the list."""
+        recipe = create_recipe(user=self.user)
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Vegan'))
+
+        res = self.client.get(RECIPES_URL, {'fields': 'id,title,price'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['results'], [{
+            'id': recipe.id,
+            'title': recipe.title,
+            'price': '5.25',
+        }])
+
+    def test_detail_sparse_fields(self):
+        """Test only the requested fields are returned in the detail."""
+        recipe = create_recipe(user=self.user)
+
+        res = self.client.get(
+            detail_url(recipe.id), {'fields': 'description,tags'},
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, {
+            'description': recipe.description,
+            'tags': [],
+        })
+
+    def test_detail_sparse_fields_images(self):
+        """Test asking for fields whose source is another column."""
+        recipe = create_recipe(user=self.user)
+        Recipe.objects.filter(id=recipe.id).update(image_variants=[{
+            'name': 'full', 'width': 10, 'height': 8, 'jpeg': 'a/full.jpg',
+        }])
+        images = self.client.get(detail_url(recipe.id)).data['images']
+
+        for param, expected in (
+            ('images', {'images': images}),
+            ('id,images', {'id': recipe.id, 'images': images}),
+        ):
+            res = self.client.get(detail_url(recipe.id), {'fields': param})
+
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertEqual(res.data, expected)
+            self.assertIn('sizes', res.data['images'])
+
+    def test_sparse_fields_unknown(self):
+        """Test asking for an unknown field returns an error."""
+        res = self.client.get(RECIPES_URL, {'fields': 'id,user'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
 
     # Tạo ra 1 recipe mới, Tạo ra các tag mới đồng thời nếu các tag đó
     # chưa tồn tại, Gắn các tag và recipe, Các tag phải thuộc về user hiện tại
@@ -296,6 +590,50 @@ class PrivateRecipeApiTest(TestCase):
             ).exists()
             self.assertTrue(exist)
 
+    def test_create_recipe_tag_name_variants(self):
+        """Test tag names differing by case or spaces reuse one tag."""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        payload = {
+            'title': 'Salad',
+            'time_minutes': 10,
+            'price': Decimal('2.00'),
+            'tags': [
+                {'name': ' vegan '},
+                {'name': 'Quick  lunch'},
+                {'name': 'quick lunch'},
+            ],
+        }
+
+        res = self.client.post(RECIPES_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        names = Tag.objects.filter(user=self.user).values_list(
+            'name', flat=True,
+        )
+        self.assertEqual(sorted(names), ['Quick lunch', 'Vegan'])
+        recipe = Recipe.objects.get(id=res.data['id'])
+        self.assertIn(tag, recipe.tags.all())
+        self.assertEqual(recipe.tags.count(), 2)
+
+    def test_create_recipe_non_ascii_tag_names(self):
+        """Test tags whose case folding differs outside Python match."""
+        payload = {
+            'title': 'Fish',
+            'time_minutes': 10,
+            'price': Decimal('2.00'),
+            'tags': [{'name': 'İzmir'}, {'name': 'ΨΑΡΟΣ'}],
+        }
+
+        for _ in range(2):
+            res = self.client.post(RECIPES_URL, payload, format='json')
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+        names = Tag.objects.filter(user=self.user).values_list(
+            'name', flat=True,
+        )
+        self.assertEqual(sorted(names), ['İzmir', 'ΨΑΡΟΣ'])
+        recipe = Recipe.objects.get(id=res.data['id'])
+        self.assertEqual(recipe.tags.count(), 2)
 
     def test_created_tag_on_update(self):
         """Test creating tag when updating a recipe."""
@@ -338,6 +676,47 @@ class PrivateRecipeApiTest(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(recipe.tags.count(), 0)
 
+    def test_update_unchanged_tags_no_through_writes(self):
+        """Test sending the same tags does not rewrite the link table."""
+        recipe = create_recipe(user=self.user)
+        recipe.tags.add(
+            Tag.objects.create(user=self.user, name='Breakfast'),
+            Tag.objects.create(user=self.user, name='Lunch'),
+        )
+        payload = {'tags': [{'name': 'Lunch'}, {'name': 'Breakfast'}]}
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.patch(
+                detail_url(recipe.id), payload, format='json',
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        writes = [
+            q['sql'] for q in queries
+            if 'core_recipe_tags' in q['sql']
+            and q['sql'].startswith(('INSERT', 'DELETE', 'UPDATE'))
+        ]
+        self.assertEqual(writes, [])
+        self.assertEqual(recipe.tags.count(), 2)
+
+    def test_update_tags_keeps_unchanged_rows(self):
+        """Test replacing one tag leaves the other link rows in place."""
+        recipe = create_recipe(user=self.user)
+        recipe.tags.add(
+            Tag.objects.create(user=self.user, name='Breakfast'),
+            Tag.objects.create(user=self.user, name='Lunch'),
+        )
+        through = Recipe.tags.through
+        kept = through.objects.get(recipe=recipe, tag__name='Lunch')
+        payload = {'tags': [{'name': 'Lunch'}, {'name': 'Dinner'}]}
+
+        res = self.client.patch(detail_url(recipe.id), payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(through.objects.filter(id=kept.id).exists())
+        names = set(recipe.tags.values_list('name', flat=True))
+        self.assertEqual(names, {'Lunch', 'Dinner'})
+
     def test_create_recipe_with_new_ingredients(self):
         """Test creating a recipe with new ingredients"""
         payload = {
@@ -437,22 +816,148 @@ class ImageUploadTest(TestCase):
         self.recipe = create_recipe(user=self.user)
 
     def tearDown(self):
+        self.recipe.refresh_from_db()
+        for name in variant_files(self.recipe.image_variants):
+            self.recipe.image.storage.delete(name)
         self.recipe.image.delete()
+        self.recipe.image_upload.delete()
 
-    def test_upload_image(self):
-        """Test uploading an image to a recipe."""
+    def _upload(self, size=(10, 10)):
         url = image_upload_url(self.recipe.id)
         with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
-            img = Image.new('RGB', (10, 10))
+            img = Image.new('RGB', size)
             img.save(image_file, format='JPEG')
             image_file.seek(0)
             payload = {'image': image_file}
-            res = self.client.post(url, payload, format='multipart')
-        
+            return self.client.post(url, payload, format='multipart')
+
+    def test_upload_image(self):
+        """Test uploading an image queues it for processing."""
+        res = self._upload()
+
         self.recipe.refresh_from_db()
-        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(res.data['image_status'], ImageStatus.PENDING)
         self.assertIn('image', res.data)
+        self.assertTrue(os.path.exists(self.recipe.image_upload.path))
+        self.assertFalse(self.recipe.image)
+
+    def test_processed_image(self):
+        """Test the worker stores the processed image."""
+        self._upload(size=(300, 200))
+
+        with self.settings(RECIPE_IMAGE_MAX_SIZE=100):
+            call_command('process_images', '--once', stdout=StringIO())
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, ImageStatus.READY)
+        self.assertFalse(self.recipe.image_upload)
         self.assertTrue(os.path.exists(self.recipe.image.path))
+        with Image.open(self.recipe.image.path) as image:
+            self.assertEqual(image.size, (100, 67))
+        self.assertEqual(self.recipe.image_metadata['original_width'], 300)
+        res = self.client.get(detail_url(self.recipe.id))
+        self.assertEqual(res.data['image_status'], ImageStatus.READY)
+
+    def test_image_variants(self):
+        """Test the resized images are listed with their URLs and sizes."""
+        self._upload(size=(1000, 600))
+        call_command('process_images', '--once', stdout=StringIO())
+
+        res = self.client.get(RECIPES_URL)
+
+        images = res.data['results'][0]['images']
+        self.assertEqual(list(images['sizes']), ['thumbnail', 'card', 'full'])
+        self.assertEqual(
+            [(size['width'], size['height'])
+             for size in images['sizes'].values()],
+            [(128, 77), (480, 288), (1000, 600)],
+        )
+        for image_format in IMAGE_FORMATS:
+            thumbnail = images['sizes']['thumbnail'][image_format]
+            self.assertTrue(thumbnail.startswith('http://testserver/'))
+            self.assertTrue(images['srcset'][image_format].startswith(
+                f'{thumbnail} 128w, '
+            ))
+        self.recipe.refresh_from_db()
+        for name in variant_files(self.recipe.image_variants):
+            self.assertTrue(self.recipe.image.storage.exists(name))
+
+    def test_upload_of_processed_content(self):
+        """Test uploading bytes processed before reuses their images."""
+        output = BytesIO()
+        Image.new('RGB', (10, 10)).save(output, format='PNG')
+        self._upload_raw(output.getvalue(), '.png')
+        call_command('process_images', '--once', stdout=StringIO())
+        self.recipe.refresh_from_db()
+        other = create_recipe(user=self.user)
+
+        with tempfile.NamedTemporaryFile(suffix='.png') as upload:
+            upload.write(output.getvalue())
+            upload.seek(0)
+            res = self.client.post(
+                image_upload_url(other.id), {'image': upload},
+                format='multipart',
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(res.data['image_status'], ImageStatus.READY)
+        other.refresh_from_db()
+        self.assertEqual(other.image.name, self.recipe.image.name)
+        self.assertEqual(other.image_blob_id, self.recipe.image_blob_id)
+        self.assertFalse(other.image_upload)
+
+    def test_processed_content_replaces_legacy_image(self):
+        """Test reusing a blob deletes the files of an image without one."""
+        output = BytesIO()
+        Image.new('RGB', (10, 10)).save(output, format='PNG')
+        self._upload_raw(output.getvalue(), '.png')
+        call_command('process_images', '--once', stdout=StringIO())
+        self.recipe.refresh_from_db()
+        storage = self.recipe.image.storage
+        legacy = [
+            storage.save(
+                f'uploads/recipe/legacy-{name}.jpg', ContentFile(b'x'),
+            )
+            for name in ('full', 'thumbnail')
+        ]
+        other = create_recipe(
+            user=self.user, image=legacy[0], image_status=ImageStatus.READY,
+            image_variants=[
+                {'name': 'full', 'width': 10, 'height': 10,
+                 'jpeg': legacy[0]},
+                {'name': 'thumbnail', 'width': 5, 'height': 5,
+                 'jpeg': legacy[1]},
+            ],
+        )
+
+        with tempfile.NamedTemporaryFile(suffix='.png') as upload:
+            upload.write(output.getvalue())
+            upload.seek(0)
+            with self.captureOnCommitCallbacks(execute=True):
+                res = self.client.post(
+                    image_upload_url(other.id), {'image': upload},
+                    format='multipart',
+                )
+
+        self.assertEqual(res.data['image_status'], ImageStatus.READY)
+        for name in legacy:
+            self.assertFalse(storage.exists(name))
+        for name in variant_files(self.recipe.image_variants):
+            self.assertTrue(storage.exists(name))
+
+    def test_upload_replaces_pending_upload(self):
+        """Test a new upload replaces the raw file still queued."""
+        self._upload()
+        self.recipe.refresh_from_db()
+        first = self.recipe.image_upload.path
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self._upload()
+
+        self.recipe.refresh_from_db()
+        self.assertFalse(os.path.exists(first))
+        self.assertTrue(os.path.exists(self.recipe.image_upload.path))
 
     def test_upload_image_bad_request(self):
         """Test uploading invalid image"""
@@ -460,4 +965,452 @@ class ImageUploadTest(TestCase):
         payload = {'image': 'notanimage'}
         res = self.client.post(url, payload, format='multipart')
 
-        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def _upload_raw(self, content, suffix):
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix=suffix) as upload:
+            upload.write(content)
+            upload.seek(0)
+            return self.client.post(url, {'image': upload}, format='multipart')
+
+    def test_upload_streams_to_storage(self):
+        """Test the upload is written to its final place while received."""
+        output = BytesIO()
+        Image.new('RGB', (10, 10)).save(output, format='PNG')
+
+        with patch.object(
+            StoredUploadedFile, 'keep', autospec=True,
+            side_effect=StoredUploadedFile.keep,
+        ) as keep:
+            res = self._upload_raw(output.getvalue(), '.png')
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        keep.assert_called_once()
+        self.recipe.refresh_from_db()
+        with self.recipe.image_upload.open('rb') as f:
+            self.assertEqual(f.read(), output.getvalue())
+
+    def test_rejected_upload_is_removed(self):
+        """Test a file that is not an image is rejected and deleted."""
+        raw_dir = os.path.dirname(
+            self.recipe.image_upload.storage.path(
+                recipe_upload_file_path(None, 'x.jpg'),
+            ),
+        )
+        os.makedirs(raw_dir, exist_ok=True)
+        before = set(os.listdir(raw_dir))
+
+        res = self._upload_raw(b'not an image', '.jpg')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(set(os.listdir(raw_dir)), before)
+
+    def test_upload_unsupported_format(self):
+        """Test images in formats that are not accepted are rejected."""
+        output = BytesIO()
+        Image.new('RGB', (10, 10)).save(output, format='BMP')
+
+        res = self._upload_raw(output.getvalue(), '.bmp')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class RecipeQueryCountTests(TestCase):
+    """Test the number of queries used by the recipe API."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='test123')
+        self.client.force_authenticate(self.user)
+
+    def _create_recipes(self, count):
+        """Create recipes that each have a tag and an ingredient."""
+        recipes = []
+        for i in range(count):
+            recipe = create_recipe(user=self.user, title=f'Recipe {i}')
+            recipe.tags.add(
+                Tag.objects.create(user=self.user, name=f'Tag {i}')
+            )
+            recipe.ingredients.add(
+                Ingredient.objects.create(user=self.user, name=f'Ing {i}')
+            )
+            recipes.append(recipe)
+        return recipes
+
+    def test_list_recipes_query_count(self):
+        """Test listing recipes uses a fixed number of queries."""
+        self._create_recipes(10)
+
+        # 1 query cho ETag, 1 cho recipes, 1 cho tags, 1 cho ingredients
+        with self.assertNumQueries(4):
+            res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['results']), 10)
+
+    def test_next_page_query_count(self):
+        """Test a later page costs the same queries as the first page."""
+        self._create_recipes(6)
+        res = self.client.get(RECIPES_URL, {'page_size': 2})
+
+        with self.assertNumQueries(4):
+            res = self.client.get(res.data['next'])
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['results']), 2)
+
+    def test_list_sparse_fields_query_count(self):
+        """Test fields left out of ?fields= are not fetched."""
+        self._create_recipes(5)
+
+        # Không lấy tags/ingredients khi client không yêu cầu
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(RECIPES_URL, {'fields': 'id,title'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(queries), 2)
+        self.assertNotIn('"description"', queries[1]['sql'])
+
+    def test_retrieve_recipe_query_count(self):
+        """Test retrieving a recipe uses a fixed number of queries."""
+        recipe = self._create_recipes(3)[0]
+        recipe.tags.add(*Tag.objects.filter(user=self.user))
+
+        with self.assertNumQueries(4):
+            res = self.client.get(detail_url(recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['tags']), 3)
+
+    def test_create_recipe_query_count(self):
+        """Test creating a recipe does not depend on existing recipes."""
+        self._create_recipes(10)
+        payload = {
+            'title': 'Sample recipe',
+            'time_minutes': 30,
+            'price': Decimal('5.99'),
+        }
+
+        with self.assertNumQueries(3):
+            res = self.client.post(RECIPES_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+    def test_create_recipe_with_tags_query_count(self):
+        """Test the number of tags does not change the query count."""
+        Tag.objects.create(user=self.user, name='Tag 0')
+
+        def post(count):
+            payload = {
+                'title': 'Sample recipe',
+                'time_minutes': 30,
+                'price': Decimal('5.99'),
+                'tags': [{'name': f'Tag {i}'} for i in range(count)],
+            }
+            with CaptureQueriesContext(connection) as queries:
+                res = self.client.post(RECIPES_URL, payload, format='json')
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+            return len(queries)
+
+        self.assertEqual(post(2), post(20))
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 20)
+
+    def test_update_recipe_query_count(self):
+        """Test updating a recipe does not depend on existing recipes."""
+        recipe = self._create_recipes(10)[0]
+        payload = {'title': 'New recipe title'}
+
+        with self.assertNumQueries(6):
+            res = self.client.patch(detail_url(recipe.id), payload)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['tags']), 1)
+
+
+class RecipeExportTests(TestCase):
+    """Test the streaming recipe export."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='test123')
+        self.client.force_authenticate(self.user)
+
+    def _read_lines(self, res):
+        content = b''.join(res.streaming_content)
+        return [json.loads(line) for line in content.splitlines()]
+
+    @patch('recipe.views.EXPORT_CHUNK_SIZE', 2)
+    def test_export_recipes(self):
+        """Test exporting recipes as newline-delimited JSON."""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        for i in range(5):
+            recipe = create_recipe(user=self.user, title=f'Recipe {i}')
+            recipe.tags.add(tag)
+        other_user = create_user(email='other@example.com', password='pw123')
+        create_recipe(user=other_user)
+
+        res = self.client.get(EXPORT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.streaming)
+        self.assertEqual(res['Content-Type'], 'application/x-ndjson')
+        recipes = Recipe.objects.filter(user=self.user).order_by('-id')
+        serializer = RecipeDetailSerializer(recipes, many=True)
+        expected = json.loads(JSONRenderer().render(serializer.data))
+        self.assertEqual(self._read_lines(res), expected)
+
+    def test_export_empty(self):
+        """Test exporting without recipes returns an empty body."""
+        res = self.client.get(EXPORT_URL, HTTP_ACCEPT='application/x-ndjson')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(self._read_lines(res), [])
+
+
+class RecipeExportStreamTests(TransactionTestCase):
+    """Test the export streams from the database."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='test123')
+        self.client.force_authenticate(self.user)
+
+    @patch('recipe.views.EXPORT_CHUNK_SIZE', 2)
+    def test_export_streams_in_transaction(self):
+        """Test rows are not read through a holdable cursor."""
+        for i in range(3):
+            create_recipe(user=self.user, title=f'Recipe {i}')
+        iterate = SerializerProjection.iterate
+        holdable = []
+
+        def checked(projection, rows, chunk_size):
+            for item in iterate(projection, rows, chunk_size):
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        'SELECT coalesce(bool_or(is_holdable), false) '
+                        'FROM pg_cursors'
+                    )
+                    holdable.append(cursor.fetchone()[0])
+                yield item
+
+        with patch.object(SerializerProjection, 'iterate', checked):
+            res = self.client.get(EXPORT_URL)
+            content = b''.join(res.streaming_content)
+
+        self.assertEqual(len(content.splitlines()), 3)
+        self.assertEqual(holdable, [False] * 3)
+        self.assertFalse(connection.in_atomic_block)
+
+class RecipeBulkTests(TestCase):
+    """Test the bulk create/update recipe API."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='test123')
+        self.client.force_authenticate(self.user)
+
+    def _payload(self, count):
+        return [
+            {
+                'title': f'Recipe {i}',
+                'time_minutes': 10 + i,
+                'price': '2.50',
+                'tags': [{'name': 'Dinner'}, {'name': f'Tag {i}'}],
+                'ingredients': [{'name': f'Salt {count}'}],
+            }
+            for i in range(count)
+        ]
+
+    def test_bulk_create(self):
+        """Test creating many recipes with nested tags/ingredients."""
+        Tag.objects.create(user=self.user, name='Dinner')
+        payload = self._payload(3)
+
+        res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [r['title'] for r in res.data], [p['title'] for p in payload],
+        )
+        recipes = Recipe.objects.filter(user=self.user).order_by('id')
+        self.assertEqual(recipes.count(), 3)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 4)
+        self.assertEqual(Ingredient.objects.filter(user=self.user).count(), 1)
+        for recipe, data in zip(recipes, res.data):
+            self.assertEqual(data, RecipeDetailSerializer(recipe).data)
+            self.assertEqual(recipe.tags.count(), 2)
+            self.assertEqual(recipe.ingredients.count(), 1)
+
+    def test_bulk_create_query_count(self):
+        """Test the number of queries does not grow with the payload."""
+        with CaptureQueriesContext(connection) as small:
+            self.client.post(BULK_URL, self._payload(2), format='json')
+        with CaptureQueriesContext(connection) as large:
+            self.client.post(BULK_URL, self._payload(20), format='json')
+
+        self.assertEqual(len(small), len(large))
+
+    def test_bulk_update(self):
+        """Test updating existing recipes together with new ones."""
+        recipe = create_recipe(user=self.user, title='Old title')
+        tag = Tag.objects.create(user=self.user, name='Old tag')
+        recipe.tags.add(tag)
+        payload = [
+            {
+                'id': recipe.id,
+                'title': 'New title',
+                'time_minutes': 5,
+                'price': '1.00',
+                'tags': [{'name': 'New tag'}],
+            },
+            {'title': 'Created', 'time_minutes': 5, 'price': '1.00'},
+        ]
+
+        res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.title, 'New title')
+        self.assertEqual(recipe.description, 'Sample description')
+        self.assertEqual(
+            list(recipe.tags.values_list('name', flat=True)), ['New tag'],
+        )
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(res.data[0]['id'], recipe.id)
+
+    def test_bulk_update_other_users_recipe(self):
+        """Test recipes of other users cannot be updated in bulk."""
+        other_user = create_user(email='other@example.com', password='pw123')
+        recipe = create_recipe(user=other_user, title='Other')
+        payload = [{
+            'id': recipe.id,
+            'title': 'Hijacked',
+            'time_minutes': 5,
+            'price': '1.00',
+        }]
+
+        res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.title, 'Other')
+
+    def test_bulk_invalid_item(self):
+        """Test one invalid item rejects the whole payload."""
+        payload = self._payload(2)
+        payload[1]['time_minutes'] = 0
+
+        res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Recipe.objects.filter(user=self.user).exists())
+
+    def test_bulk_invalidates_cache(self):
+        """Test bulk writes are visible in the cached list."""
+        self.client.get(RECIPES_URL)
+
+        self.client.post(BULK_URL, self._payload(2), format='json')
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(len(res.data['results']), 2)
+
+
+class RecipeBulkDeleteTests(TestCase):
+    """Test the bulk delete recipe API."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='test123')
+        self.client.force_authenticate(self.user)
+
+    def _create_recipes(self, count):
+        tag = Tag.objects.create(user=self.user, name='Dinner')
+        recipes = []
+        for i in range(count):
+            recipe = create_recipe(user=self.user, title=f'Recipe {i}')
+            recipe.tags.add(tag)
+            recipes.append(recipe)
+        return recipes
+
+    def test_bulk_delete_by_ids(self):
+        """Test deleting recipes and their tag links by id."""
+        recipes = self._create_recipes(3)
+        payload = {'ids': [recipes[0].id, recipes[1].id]}
+
+        res = self.client.post(BULK_DELETE_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, {'deleted': 2})
+        self.assertEqual(
+            list(Recipe.objects.values_list('id', flat=True)),
+            [recipes[2].id],
+        )
+        self.assertEqual(Recipe.tags.through.objects.count(), 1)
+        self.assertTrue(Tag.objects.filter(name='Dinner').exists())
+
+    def test_bulk_delete_by_filter(self):
+        """Test deleting every recipe matching the list filters."""
+        recipes = self._create_recipes(2)
+        other = create_recipe(user=self.user, title='No tag')
+        tag_id = recipes[0].tags.get().id
+
+        res = self.client.post(
+            f'{BULK_DELETE_URL}?tags={tag_id}', {}, format='json',
+        )
+
+        self.assertEqual(res.data, {'deleted': 2})
+        self.assertEqual(
+            list(Recipe.objects.values_list('id', flat=True)), [other.id],
+        )
+
+    def test_bulk_delete_requires_ids_or_filter(self):
+        """Test an empty request does not delete every recipe."""
+        self._create_recipes(2)
+
+        res = self.client.post(BULK_DELETE_URL, {}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Recipe.objects.count(), 2)
+
+    def test_bulk_delete_other_users_recipe(self):
+        """Test recipes of other users are not deleted."""
+        other_user = create_user(email='other@example.com', password='pw123')
+        recipe = create_recipe(user=other_user)
+
+        res = self.client.post(
+            BULK_DELETE_URL, {'ids': [recipe.id]}, format='json',
+        )
+
+        self.assertEqual(res.data, {'deleted': 0})
+        self.assertTrue(Recipe.objects.filter(id=recipe.id).exists())
+
+    def test_bulk_delete_query_count(self):
+        """Test the number of queries does not grow with the ids."""
+        recipes = self._create_recipes(20)
+
+        with CaptureQueriesContext(connection) as small:
+            self.client.post(
+                BULK_DELETE_URL, {'ids': [recipes[0].id]}, format='json',
+            )
+        with CaptureQueriesContext(connection) as large:
+            self.client.post(
+                BULK_DELETE_URL,
+                {'ids': [recipe.id for recipe in recipes[1:]]},
+                format='json',
+            )
+
+        self.assertEqual(len(small), len(large))
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_bulk_delete_invalidates_cache(self):
+        """Test deleted recipes disappear from the cached list."""
+        recipes = self._create_recipes(2)
+        self.client.get(RECIPES_URL)
+
+        self.client.post(
+            BULK_DELETE_URL, {'ids': [recipes[0].id]}, format='json',
+        )
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(len(res.data['results']), 1)
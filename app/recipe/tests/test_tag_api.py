@@ -3,17 +3,20 @@ Tests for the tags API.
 """
 
 from django.contrib.auth import get_user_model
+from django.db import connection
 from django.urls import reverse
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 
 
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from core.models import Tag
+from core.models import Recipe, Tag
 from recipe.serializers import TagSerializer
 
 TAGS_URL = reverse('recipe:tag-list')
+BULK_DELETE_URL = reverse('recipe:tag-bulk-delete')
 
 def detail_url(tag_id):
     """Create and return a tag detail url."""
@@ -55,7 +58,7 @@ class PrivateTagsApiTests(TestCase):
         tags = Tag.objects.all().order_by('-name')
         serializer = TagSerializer(tags, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_tags_limited_to_user(self):
         """Test list of tags is limited to authenticated user."""
@@ -66,9 +69,131 @@ class PrivateTagsApiTests(TestCase):
         res = self.client.get(TAGS_URL)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data[0]['name'], tag.name)
-        self.assertEqual(res.data[0]['id'], tag.id)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['results'][0]['name'], tag.name)
+        self.assertEqual(res.data['results'][0]['id'], tag.id)
+
+    def test_tags_paginated_by_name(self):
+        """Test the tag list is paginated in name order."""
+        for name in ['Apple', 'Banana', 'Cherry']:
+            Tag.objects.create(user=self.user, name=name)
+
+        res = self.client.get(TAGS_URL, {'page_size': 2})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        names = [t['name'] for t in res.data['results']]
+        self.assertEqual(names, ['Cherry', 'Banana'])
+
+        res = self.client.get(res.data['next'])
+
+        names = [t['name'] for t in res.data['results']]
+        self.assertEqual(names, ['Apple'])
+        self.assertIsNone(res.data['next'])
+
+    def test_tag_usage_count(self):
+        """Test usage_count follows the recipes linked to a tag."""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipes = [
+            Recipe.objects.create(
+                user=self.user, title=f'Recipe {i}',
+                time_minutes=5, price='1.00',
+            )
+            for i in range(3)
+        ]
+        for recipe in recipes:
+            recipe.tags.add(tag)
+        recipes[0].tags.remove(tag)
+        recipes[1].delete()
+
+        # Đổi tên không được ghi đè giá trị do trigger cập nhật
+        tag.name = 'Vegetarian'
+        tag.save()
+
+        res = self.client.get(TAGS_URL)
+
+        self.assertEqual(res.data['results'][0]['usage_count'], 1)
+        tag.refresh_from_db()
+        self.assertEqual(tag.usage_count, 1)
+
+    def test_tags_ordered_by_usage(self):
+        """Test ordering tags by the number of recipes using them."""
+        tags = [
+            Tag.objects.create(user=self.user, name=name)
+            for name in ('Rare', 'Popular', 'Common')
+        ]
+        for i in range(3):
+            recipe = Recipe.objects.create(
+                user=self.user, title=f'Recipe {i}',
+                time_minutes=5, price='1.00',
+            )
+            recipe.tags.add(*tags[i:])
+
+        res = self.client.get(TAGS_URL, {'ordering': '-usage'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        names = [t['name'] for t in res.data['results']]
+        self.assertEqual(names, ['Common', 'Popular', 'Rare'])
+        counts = [t['usage_count'] for t in res.data['results']]
+        self.assertEqual(counts, [3, 2, 1])
+
+    def test_tags_invalid_ordering(self):
+        """Test an unknown ordering returns an error."""
+        res = self.client.get(TAGS_URL, {'ordering': 'usage_count'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_ordering_ignored_outside_list(self):
+        """Test ?ordering= is not validated by detail actions."""
+        tag = Tag.objects.create(user=self.user, name='Breakfast')
+        url = f'{detail_url(tag.id)}?ordering=foo'
+
+        res = self.client.patch(url, {'name': 'Brunch'})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        res = self.client.delete(url)
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+
+    def test_filter_tags_assigned_to_recipes(self):
+        """Test listing tags by those assigned to recipes."""
+        tag1 = Tag.objects.create(user=self.user, name='Breakfast')
+        tag2 = Tag.objects.create(user=self.user, name='Lunch')
+        recipes = [
+            Recipe.objects.create(
+                user=self.user, title=f'Recipe {i}',
+                time_minutes=5, price='1.00',
+            )
+            for i in range(2)
+        ]
+        for recipe in recipes:
+            recipe.tags.add(tag1)
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(TAGS_URL, {'assigned_only': 1})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        ids = [t['id'] for t in res.data['results']]
+        self.assertEqual(ids, [tag1.id])
+        self.assertNotIn(tag2.id, ids)
+        sql = queries[-1]['sql']
+        self.assertIn('EXISTS', sql)
+        self.assertNotIn('DISTINCT', sql)
+
+    def test_filter_assigned_only_invalid(self):
+        """Test an invalid assigned_only value returns an error."""
+        res = self.client.get(TAGS_URL, {'assigned_only': 'yes'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_filter_params_ignored_outside_list(self):
+        """Test list filter params do not affect detail actions."""
+        tag = Tag.objects.create(user=self.user, name='Breakfast')
+        url = f'{detail_url(tag.id)}?assigned_only=1'
+
+        res = self.client.patch(url, {'name': 'Brunch'})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        res = self.client.delete(url)
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
 
     def test_update_tag(self):
         """Test updating a tag."""
@@ -82,6 +207,36 @@ class PrivateTagsApiTests(TestCase):
         tag.refresh_from_db()
         self.assertEqual(tag.name, payload['name'])
 
+    def test_update_tag_duplicate_name_error(self):
+        """Test renaming a tag to an existing name returns an error."""
+        Tag.objects.create(user=self.user, name='Dessert')
+        tag = Tag.objects.create(user=self.user, name='After dinner')
+
+        res = self.client.patch(detail_url(tag.id), {'name': 'Dessert'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        tag.refresh_from_db()
+        self.assertEqual(tag.name, 'After dinner')
+
+    def test_update_tag_duplicate_name_other_case_error(self):
+        """Test names are compared without case and extra spaces."""
+        Tag.objects.create(user=self.user, name='Dessert')
+        tag = Tag.objects.create(user=self.user, name='After dinner')
+
+        res = self.client.patch(detail_url(tag.id), {'name': ' dessert'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_update_tag_change_case(self):
+        """Test a tag can be renamed to another case of its own name."""
+        tag = Tag.objects.create(user=self.user, name='after  dinner')
+
+        res = self.client.patch(detail_url(tag.id), {'name': 'After dinner'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        tag.refresh_from_db()
+        self.assertEqual(tag.name, 'After dinner')
+
     def test_delete_tag(self):
         """Test deleting a tag."""
         tag = Tag.objects.create(user=self.user, name='Breakfast')
@@ -91,4 +246,30 @@ class PrivateTagsApiTests(TestCase):
 
         self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
         tags = Tag.objects.filter(user=self.user)
-        self.assertFalse(tags.exists())
\ No newline at end of file
+        self.assertFalse(tags.exists())
+
+    def test_bulk_delete_tags(self):
+        """Test deleting many tags removes them from recipes."""
+        tags = [
+            Tag.objects.create(user=self.user, name=name)
+            for name in ('Breakfast', 'Lunch', 'Dinner')
+        ]
+        recipe = Recipe.objects.create(
+            user=self.user, title='Eggs', time_minutes=5, price='1.00',
+        )
+        recipe.tags.add(*tags)
+        updated_at = recipe.updated_at
+        payload = {'ids': [tags[0].id, tags[1].id]}
+
+        res = self.client.post(BULK_DELETE_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, {'deleted': 2})
+        names = Tag.objects.values_list('name', flat=True)
+        self.assertEqual(list(names), ['Dinner'])
+        self.assertEqual(list(recipe.tags.all()), [tags[2]])
+        self.assertEqual(
+            Tag.objects.get(id=tags[2].id).usage_count, 1,
+        )
+        recipe.refresh_from_db()
+        self.assertGreater(recipe.updated_at, updated_at)
@@ -0,0 +1,82 @@
+"""
+Streaming upload handling for recipe images.
+
+Django's default handlers keep small uploads in memory and write larger
+ones to a temporary file that is copied again when the model is saved.
+The handler here writes every chunk straight to the file the recipe will
+point to and hashes it on the way, so memory use per upload stays at one
+chunk whatever the file size.
+"""
+import hashlib
+import os
+
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+
+from core.models import Recipe, recipe_upload_file_path
+
+
+class StoredUploadedFile(UploadedFile):
+    """A file uploaded to its final location in the storage of the recipe
+    uploads.
+
+    The file is deleted when the request is closed unless `keep()` was
+    called, so rejected uploads do not stay behind.
+    """
+
+    def __init__(self, name, content_type, size, charset,
+                 content_type_extra=None):
+        storage = Recipe._meta.get_field('image_upload').storage
+        self.storage_name = storage.get_available_name(
+            recipe_upload_file_path(None, name),
+        )
+        path = storage.path(self.storage_name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 'x' không ghi đè file trùng tên của request khác
+        file = open(path, 'x+b')
+        super().__init__(
+            file, name, content_type, size, charset, content_type_extra,
+        )
+        self.sha256 = hashlib.sha256()
+        self.kept = False
+
+    def temporary_file_path(self):
+        """Return the full path of this file."""
+        return self.file.name
+
+    def keep(self):
+        """Keep the file after the request, it is now used by a recipe."""
+        self.kept = True
+
+    def close(self):
+        self.file.close()
+        if not self.kept:
+            try:
+                os.remove(self.file.name)
+            except FileNotFoundError:
+                pass
+
+
+class RecipeImageUploadHandler(FileUploadHandler):
+    """Upload handler that streams files into the recipe upload storage."""
+
+    def new_file(self, *args, **kwargs):
+        """Create the file the data is written to as it comes in."""
+        super().new_file(*args, **kwargs)
+        self.file = StoredUploadedFile(
+            self.file_name, self.content_type, 0, self.charset,
+            self.content_type_extra,
+        )
+
+    def receive_data_chunk(self, raw_data, start):
+        self.file.sha256.update(raw_data)
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        self.file.seek(0)
+        self.file.size = file_size
+        return self.file
+
+    def upload_interrupted(self):
+        if hasattr(self, 'file'):
+            self.file.close()
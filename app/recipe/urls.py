@@ -19,4 +19,5 @@ app_name = 'recipe'
 
 urlpatterns = [
     path('', include(router.urls)),
+    path('media/<path:path>', views.RecipeMediaView.as_view(), name='media'),
 ]
@@ -1,5 +1,25 @@
 """View for the recipe APIs"""
 
+from django.http import StreamingHttpResponse
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import transaction
+from django.db.models import (
+    Count,
+    Exists,
+    F,
+    FloatField,
+    Max,
+    OuterRef,
+    Prefetch,
+)
+from django.db.models.functions import Cast
+from drf_spectacular.utils import (
+    extend_schema_view,
+    extend_schema,
+    OpenApiParameter,
+    OpenApiTypes,
+)
+
 # Là một viewset của DRF tự động cung cấp các hành động
 from rest_framework import (
     viewsets,
@@ -7,18 +27,30 @@ from rest_framework import (
     status,
 )
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.negotiation import BaseContentNegotiation
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
+from rest_framework.views import APIView
 # Phương thức xác thực bằng token, Client phải gửi token trong header để xác thực
 from rest_framework.authentication import TokenAuthentication
 # Quyền hạn yêu cầu người dùng phải đăng nhập
 from rest_framework.permissions import IsAuthenticated
 
 from core.models import (
+    RECIPE_SEARCH_CONFIG,
     Recipe,
     Tag,
     Ingredient,
 )
-from recipe import serializers
+from recipe import deletion, media, serializers
+from recipe.cache import bump_cache_version, cache_response
+from recipe.conditional import conditional_response, make_etag
+from recipe.idempotency import IDEMPOTENCY_KEY_HEADER, idempotent
+from recipe.pagination import RecipeCursorPagination
+from recipe.projections import SerializerProjection, read_snapshot
+from recipe.renderers import NDJSONRenderer
+from recipe.uploads import RecipeImageUploadHandler
 
 # VD về model viewset
 # GET /recipes/          -> Lấy danh sách recipe
@@ -27,46 +59,420 @@ from recipe import serializers
 # PUT /recipes/{id}/     -> Cập nhật 1 recipe
 # DELETE /recipes/{id}/  -> Xóa 1 recipe
 
+# Số recipe đọc từ server-side cursor mỗi lần khi export
+EXPORT_CHUNK_SIZE = 2000
+
+FIELDS_PARAMETER = OpenApiParameter(
+    'fields',
+    OpenApiTypes.STR,
+    description='Comma separated list of fields to return',
+)
+IDEMPOTENCY_KEY_PARAMETER = OpenApiParameter(
+    IDEMPOTENCY_KEY_HEADER,
+    OpenApiTypes.STR,
+    OpenApiParameter.HEADER,
+    description=(
+        'Unique key of the write, a retry with the same key returns the '
+        'stored response instead of writing again'
+    ),
+)
+
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class BulkDeleteMixin:
+    """Add a bulk-delete action that deletes by ids and/or list filters."""
+    # Tham số lọc của list được phép dùng để chọn các object cần xóa
+    bulk_delete_filters = ()
+
+    @extend_schema(
+        request=serializers.BulkDeleteSerializer,
+        responses=serializers.BulkDeleteSerializer,
+    )
+    @action(methods=['POST'], detail=False, url_path='bulk-delete')
+    def bulk_delete(self, request):
+        """Delete the given ids and/or every object matching the filters."""
+        serializer = serializers.BulkDeleteSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data.get('ids')
+        filtered = any(
+            request.query_params.get(name)
+            for name in self.bulk_delete_filters
+        )
+        if ids is None and not filtered:
+            raise ValidationError(
+                {'ids': 'Send a list of IDs or filter the objects to delete.'}
+            )
+
+        queryset = self.get_queryset()
+        if ids is not None:
+            queryset = queryset.filter(id__in=ids)
+        ids = list(
+            queryset.prefetch_related(None).order_by()
+            .values_list('id', flat=True)
+        )
+        with transaction.atomic():
+            deleted = deletion.bulk_delete(queryset.model, ids)
+            # Xóa bằng SQL trực tiếp không gửi signal nên tự làm mới cache
+            bump_cache_version(request.user.id)
+
+        return Response({'deleted': deleted}, status=status.HTTP_200_OK)
+
+
+@extend_schema_view(
+    list=extend_schema(
+        parameters=[
+            FIELDS_PARAMETER,
+            OpenApiParameter(
+                'tags',
+                OpenApiTypes.STR,
+                description='Comma separated list of tag IDs to filter',
+            ),
+            OpenApiParameter(
+                'ingredients',
+                OpenApiTypes.STR,
+                description='Comma separated list of ingredient IDs to filter',
+            ),
+            OpenApiParameter(
+                'match',
+                OpenApiTypes.STR,
+                enum=['any', 'all'],
+                description=(
+                    'Return recipes with any (default) or all of the '
+                    'given tags/ingredients'
+                ),
+            ),
+            OpenApiParameter(
+                'search',
+                OpenApiTypes.STR,
+                description=(
+                    'Full-text search on title and description, results '
+                    'are ordered by relevance'
+                ),
+            ),
+        ]
+    ),
+    retrieve=extend_schema(parameters=[FIELDS_PARAMETER]),
+    create=extend_schema(parameters=[IDEMPOTENCY_KEY_PARAMETER]),
+    update=extend_schema(parameters=[IDEMPOTENCY_KEY_PARAMETER]),
+    partial_update=extend_schema(parameters=[IDEMPOTENCY_KEY_PARAMETER]),
+    upload_image=extend_schema(
+        parameters=[IDEMPOTENCY_KEY_PARAMETER],
+        responses={202: serializers.RecipeImageSerializer},
+    ),
+)
+class RecipeViewSet(BulkDeleteMixin, viewsets.ModelViewSet):
     """View for manage recipe APIs"""
     serializer_class = serializers.RecipeDetailSerializer  # convert data
     queryset = Recipe.objects.all()  # getAll data
     authentication_classes = [TokenAuthentication]  # Xác thực bằng token
     permission_classes = [IsAuthenticated]  # Phải đăng nhập mới truy cập được
+    pagination_class = RecipeCursorPagination
+    ordering = ('-id',)
+    bulk_delete_filters = ('tags', 'ingredients', 'search')
+    # Các action đọc tham số lọc của list, action khác bỏ qua chúng
+    filter_actions = ('list', 'export', 'bulk_delete')
+
+    def initialize_request(self, request, *args, **kwargs):
+        """Stream image uploads straight to their storage."""
+        request = super().initialize_request(request, *args, **kwargs)
+        if self.action == 'upload_image':
+            request.upload_handlers = [RecipeImageUploadHandler(request)]
+        return request
+
+    def get_ordering(self):
+        """Return the ordering used for the list and its cursors."""
+        if (
+            self.action in self.filter_actions
+            and self.request.query_params.get('search')
+        ):
+            return ('-rank', '-id')
+        return self.ordering
+
+    def get_requested_fields(self):
+        """Return the fields asked for with ?fields=, or None for all."""
+        if self.action not in ('list', 'retrieve'):
+            return None
+        param = self.request.query_params.get('fields')
+        if not param:
+            return None
+
+        fields = [name.strip() for name in param.split(',') if name.strip()]
+        unknown = set(fields) - set(self.get_serializer_class().Meta.fields)
+        if unknown:
+            raise ValidationError(
+                {'fields': f'Unknown fields: {", ".join(sorted(unknown))}.'}
+            )
+        return fields
+
+    def _params_to_ints(self, name, qs):
+        """Convert a list of strings to integers."""
+        try:
+            return {int(str_id) for str_id in qs.split(',')}
+        except ValueError:
+            raise ValidationError(
+                {name: 'Must be a comma separated list of IDs.'}
+            )
+
+    def _filter_by_related(self, queryset, field, ids, match):
+        """Filter recipes by rows of the tags/ingredients through table.
+
+        Both modes are answered from the (<attr>_id, recipe_id) index of the
+        through table, so the recipe rows never need a DISTINCT.
+        """
+        relation = Recipe._meta.get_field(field)
+        rows = relation.remote_field.through.objects.filter(
+            **{f'{relation.m2m_reverse_name()}__in': ids}
+        )
+
+        if match == 'all':
+            recipe_ids = rows.values('recipe_id').annotate(
+                matched=Count('recipe_id')
+            ).filter(matched=len(ids)).values('recipe_id')
+            return queryset.filter(id__in=recipe_ids)
+
+        return queryset.filter(
+            Exists(rows.filter(recipe_id=OuterRef('pk')))
+        )
+
+    def _filter_list(self, queryset):
+        """Apply the tags/ingredients/match and search list parameters."""
+        match = self.request.query_params.get('match', 'any')
+        if match not in ('any', 'all'):
+            raise ValidationError({'match': 'Must be "any" or "all".'})
+        for field in ('tags', 'ingredients'):
+            param = self.request.query_params.get(field)
+            if param:
+                ids = self._params_to_ints(field, param)
+                queryset = self._filter_by_related(
+                    queryset, field, ids, match,
+                )
+
+        search = self.request.query_params.get('search')
+        if search:
+            query = SearchQuery(
+                search,
+                config=RECIPE_SEARCH_CONFIG,
+                search_type='websearch',
+            )
+            # Ép kiểu rank sang double để vị trí cursor so sánh chính xác
+            queryset = queryset.filter(search_vector=query).annotate(
+                rank=Cast(
+                    SearchRank(F('search_vector'), query),
+                    FloatField(),
+                ),
+            )
+        return queryset
 
     def get_queryset(self):
         """Retrieve recipes for authenticated user."""
-        return self.queryset.filter(user=self.request.user).order_by('-id')
+        queryset = self.queryset.filter(user=self.request.user)
+        if self.action in self.filter_actions:
+            queryset = self._filter_list(queryset)
+
+        relations = {'tags': Tag, 'ingredients': Ingredient}
+        fields = self.get_requested_fields()
+        if fields is None:
+            queryset = queryset.defer('search_vector')
+        else:
+            # Chỉ đọc các cột và quan hệ mà client yêu cầu, theo source của
+            # từng field (`images` đọc cột `image_variants`)
+            serializer_fields = self.get_serializer_class()().fields
+            columns = [
+                serializer_fields[name].source_attrs[0]
+                for name in fields if name not in relations
+            ]
+            queryset = queryset.only('id', *columns)
+
+        # Lấy sẵn tags/ingredients bằng 2 query cho cả danh sách, sắp xếp
+        # theo id giống projection của list
+        return queryset.prefetch_related(*(
+            Prefetch(name, queryset=model.objects.order_by('id'))
+            for name, model in relations.items()
+            if fields is None or name in fields
+        )).order_by(*self.get_ordering())
+
+    def get_serializer(self, *args, **kwargs):
+        """Return the serializer limited to the requested fields."""
+        fields = self.get_requested_fields()
+        if fields is not None:
+            kwargs['fields'] = fields
+        return super().get_serializer(*args, **kwargs)
 
     def get_serializer_class(self):
         """Return the serializer class for request."""
         if self.action == 'list':
             return serializers.RecipeSerializer
-        elif self.action == 'retrieve':
+        elif self.action in ('retrieve', 'export'):
             return serializers.RecipeDetailSerializer
         elif self.action == 'upload_image':
             return serializers.RecipeImageSerializer
+        elif self.action == 'bulk':
+            return serializers.RecipeBulkSerializer
         return self.serializer_class
 
+    def get_list_validators(self, request, *args, **kwargs):
+        """Return the ETag of the list from a single aggregate query."""
+        stats = self.filter_queryset(self.get_queryset()).aggregate(
+            count=Count('id'),
+            last_modified=Max('updated_at'),
+        )
+        # Không có Last-Modified: xóa recipe làm thay đổi danh sách nhưng
+        # không làm tăng max(updated_at)
+        etag = make_etag(request, stats['count'], stats['last_modified'])
+        return etag, None
+
+    def get_detail_validators(self, request, *args, **kwargs):
+        """Return the ETag and Last-Modified of a recipe."""
+        lookup = {self.lookup_field: kwargs[self.lookup_url_kwarg or 'pk']}
+        try:
+            updated_at = self.get_queryset().filter(**lookup).values_list(
+                'updated_at', flat=True,
+            ).first()
+        except (TypeError, ValueError):
+            return None
+        if updated_at is None:
+            return None
+        return make_etag(request, updated_at), updated_at
+
+    @conditional_response('get_list_validators')
+    @cache_response
+    def list(self, request, *args, **kwargs):
+        """List recipes from row projections instead of model instances."""
+        queryset = self.filter_queryset(self.get_queryset())
+        projection = SerializerProjection(self.get_serializer())
+        # Cursor cần giá trị của field đầu tiên trong ordering
+        rows = projection.values(
+            queryset, *(name.lstrip('-') for name in self.get_ordering()),
+        )
+
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(
+                projection.to_representation(page)
+            )
+        return Response(projection.to_representation(list(rows)))
+
+    @conditional_response('get_detail_validators')
+    @cache_response
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
+
+    # partial_update cũng đi qua update
+    @idempotent
+    def update(self, request, *args, **kwargs):
+        return super().update(request, *args, **kwargs)
+
     def perform_create(self, serializer):
         """Create a new recipe"""
         serializer.save(user=self.request.user)
 
+    @extend_schema(
+        responses={
+            (200, NDJSONRenderer.media_type):
+                serializers.RecipeDetailSerializer,
+        },
+    )
+    @action(
+        methods=['GET'],
+        detail=False,
+        renderer_classes=[NDJSONRenderer, JSONRenderer],
+    )
+    def export(self, request):
+        """Stream every recipe of the user as newline-delimited JSON."""
+        projection = SerializerProjection(self.get_serializer())
+        rows = projection.values(self.get_queryset())
+        renderer = NDJSONRenderer()
+
+        def lines():
+            # Transaction kéo dài suốt thời gian stream để cursor đọc từng
+            # chunk thay vì để PostgreSQL tính trước toàn bộ kết quả
+            with read_snapshot():
+                for item in projection.iterate(rows, EXPORT_CHUNK_SIZE):
+                    yield renderer.render(item)
+
+        response = StreamingHttpResponse(
+            lines(),
+            content_type=NDJSONRenderer.media_type,
+        )
+        response['Content-Disposition'] = (
+            'attachment; filename="recipes.ndjson"'
+        )
+        return response
+
+    @extend_schema(
+        request=serializers.RecipeBulkSerializer(many=True),
+        responses=serializers.RecipeDetailSerializer(many=True),
+    )
+    @action(methods=['POST'], detail=False)
+    def bulk(self, request):
+        """Create recipes without an id and update those with one."""
+        serializer = self.get_serializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic():
+            recipes = serializer.save(user=request.user)
+            # bulk_create/bulk_update không gửi signal nên tự làm mới cache
+            bump_cache_version(request.user.id)
+
+        projection = SerializerProjection(
+            serializers.RecipeDetailSerializer(
+                context=self.get_serializer_context(),
+            )
+        )
+        rows = {
+            row['id']: row
+            for row in projection.values(
+                Recipe.objects.filter(id__in=[r.id for r in recipes])
+            )
+        }
+        data = projection.to_representation(
+            [rows[recipe.id] for recipe in recipes]
+        )
+        return Response(data, status=status.HTTP_200_OK)
+
     @action(methods=['POST'], detail=True, url_path='upload-image')
+    @idempotent
     def upload_image(self, request, pk=None):
-        """Upload an image to recipe"""
+        """Upload an image to recipe.
+
+        The file is stored as is and processed by the `process_images`
+        command, the image status of the recipe shows its progress.
+        """
         recipe = self.get_object()
         serializer = self.get_serializer(instance=recipe, data=request.data)
 
         if serializer.is_valid():
             serializer.save()
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+@extend_schema_view(
+    list=extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'ordering',
+                OpenApiTypes.STR,
+                enum=['name', 'usage', '-usage'],
+                description=(
+                    'Order by name (default) or by the number of recipes '
+                    'using the item'
+                ),
+            ),
+            OpenApiParameter(
+                'assigned_only',
+                OpenApiTypes.INT,
+                enum=[0, 1],
+                description='Filter by items assigned to recipes',
+            ),
+        ]
+    )
+)
 class BaseRecipeAttrViewSet(
+    BulkDeleteMixin,
     mixins.DestroyModelMixin,
     mixins.UpdateModelMixin,
     mixins.ListModelMixin,
@@ -75,10 +481,56 @@ class BaseRecipeAttrViewSet(
     """Base viewset for recipe attribute"""
     authentication_classes = [TokenAuthentication]
     permission_classes = [IsAuthenticated]
+    pagination_class = RecipeCursorPagination
+    # id giúp thứ tự ổn định khi nhiều bản ghi trùng tên
+    ordering = ('-name', '-id')
+    orderings = {
+        'name': ordering,
+        'usage': ('usage_count', 'id'),
+        '-usage': ('-usage_count', '-id'),
+    }
+    # Các action đọc tham số lọc của list, action khác bỏ qua chúng
+    filter_actions = ('list',)
+
+    def get_ordering(self):
+        """Return the ordering used for the list and its cursors."""
+        if self.action not in self.filter_actions:
+            return self.ordering
+        param = self.request.query_params.get('ordering', 'name')
+        if param not in self.orderings:
+            raise ValidationError(
+                {'ordering': f'Must be one of {", ".join(self.orderings)}.'}
+            )
+        return self.orderings[param]
+
+    @cache_response
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    def _filter_list(self, queryset):
+        """Apply the assigned_only list parameter."""
+        assigned_only = self.request.query_params.get('assigned_only', '0')
+        if assigned_only not in ('0', '1'):
+            raise ValidationError({'assigned_only': 'Must be 0 or 1.'})
+        if assigned_only == '1':
+            # EXISTS dùng index (<attr>_id, recipe_id) của bảng trung gian,
+            # không cần JOIN rồi DISTINCT trên toàn bộ recipe
+            relation = next(
+                field for field in Recipe._meta.many_to_many
+                if field.related_model is queryset.model
+            )
+            rows = relation.remote_field.through.objects.filter(
+                **{relation.m2m_reverse_name(): OuterRef('pk')}
+            )
+            queryset = queryset.filter(Exists(rows))
+        return queryset
 
     def get_queryset(self):
         """Filter queryset to authenticated user."""
-        return self.queryset.filter(user=self.request.user).order_by('-name')
+        queryset = self.queryset.filter(user=self.request.user)
+        if self.action in self.filter_actions:
+            queryset = self._filter_list(queryset)
+        return queryset.order_by(*self.get_ordering())
 
 
 # Mixin những class nhỏ cho phép CRUD nhanh
@@ -92,3 +544,27 @@ class IngredientViewSet(BaseRecipeAttrViewSet):
     """Manage ingredients in the database."""
     serializer_class = serializers.IngredientSerializer
     queryset = Ingredient.objects.all()
+
+
+class IgnoreClientContentNegotiation(BaseContentNegotiation):
+    """Ignore the Accept header, e.g. `image/webp` sent for an image."""
+
+    def select_parser(self, request, parsers):
+        return parsers[0]
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return (renderers[0], renderers[0].media_type)
+
+
+class RecipeMediaView(APIView):
+    """Send a recipe image file to the owner of the recipe."""
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+    content_negotiation_class = IgnoreClientContentNegotiation
+
+    @extend_schema(responses={(200, 'image/*'): OpenApiTypes.BINARY})
+    def get(self, request, path):
+        """Return the file, or 404 if no recipe of the user shows it."""
+        if not media.can_read(request.user, path):
+            raise NotFound()
+        return media.media_response(path)
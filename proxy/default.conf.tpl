@@ -5,6 +5,17 @@ server {
         alias /vol/static;
     }
 
+    # Media chỉ được tải qua API, Django kiểm tra quyền rồi trả về
+    # X-Accel-Redirect tới location internal bên dưới
+    location /static/media/ {
+        return 404;
+    }
+
+    location /protected-media/ {
+        internal;
+        alias /vol/static/media/;
+    }
+
     location / {
         uwsgi_pass          ${APP_HOST}:${APP_PORT};
         include             /etc/nginx/uwsgi_params;
@@ -5,5 +5,6 @@ set -e
 python manage.py wait_for_db
 python manage.py collectstatic --noinput
 python manage.py migrate
+python manage.py createcachetable
 
 uwsgi --socket :9000 --workers 4 --master --enable-thread --module app.wsgi
\ No newline at end of file